@@ -0,0 +1,101 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from loguru import logger
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+STORED_HEADERS = ("Location",)
+IN_PROGRESS = "in-progress"
+
+
+def _cache_key(request, key):
+    user_id = request.user.pk if request.user.is_authenticated else "anon"
+    scope = f"{user_id}:{request.method}:{request.path}:{key}"
+    return "idempotency:" + hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _fingerprint(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Декоратор обработчика POST-запроса с поддержкой заголовка
+    Idempotency-Key.
+    Первый ответ сохраняется в кэше на IDEMPOTENCY_KEY_TTL секунд,
+    повторы с тем же ключом получают его без вызова обработчика.
+    Ключ привязан к пользователю, пути и телу запроса.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"error": "Слишком длинный ключ идемпотентности"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+        stored = cache.get(cache_key)
+        if stored is None and not cache.add(
+            cache_key,
+            (IN_PROGRESS, fingerprint),
+            timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+        ):
+            stored = cache.get(cache_key)
+
+        if stored is not None:
+            if stored[-1] != fingerprint:
+                return Response(
+                    {
+                        "error": "Ключ идемпотентности уже использован"
+                        " с другим запросом"
+                    },
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if stored[0] == IN_PROGRESS:
+                return Response(
+                    {"error": "Запрос с этим ключом еще выполняется"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            status_code, data, headers, _ = stored
+            logger.debug(f"Повтор ответа по ключу идемпотентности {key}")
+            response = Response(data, status=status_code, headers=headers)
+            response[REPLAYED_HEADER] = "true"
+            return response
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+            return response
+        cache.set(
+            cache_key,
+            (
+                response.status_code,
+                response.data,
+                {
+                    header: response[header]
+                    for header in STORED_HEADERS
+                    if response.has_header(header)
+                },
+                fingerprint,
+            ),
+            timeout=settings.IDEMPOTENCY_KEY_TTL,
+        )
+        return response
+
+    return wrapper
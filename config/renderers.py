@@ -0,0 +1,60 @@
+import datetime
+import decimal
+import uuid
+
+import msgpack
+import orjson
+from django.utils.functional import Promise
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+ORJSON_OPTIONS = (
+    orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+)
+
+
+def encode_default(obj):
+    """
+    Преобразование значений, которые не сериализуются напрямую:
+    Decimal и PhoneNumber - в строку, как это делают поля DRF
+    """
+    if isinstance(obj, PhoneNumber):
+        return str(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID, Promise)):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Тип {type(obj).__name__} не сериализуется")
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на orjson.
+    Datetime сериализуется нативно, UTC выводится как Z, как в DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        options = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=encode_default, option=options)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Рендерер application/msgpack для мобильных клиентов"""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
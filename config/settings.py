@@ -114,6 +114,30 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "pbkdf2")
+PASSWORD_PBKDF2_ITERATIONS = (
+    int(os.getenv("PASSWORD_PBKDF2_ITERATIONS"))
+    if os.getenv("PASSWORD_PBKDF2_ITERATIONS")
+    else None
+)
+PASSWORD_HASHER_CLASSES = {
+    "pbkdf2": "users.hashers.ConfigurablePBKDF2PasswordHasher",
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher
+    for name, hasher in PASSWORD_HASHER_CLASSES.items()
+    if name != PASSWORD_HASHER
+]
+
+AUTHENTICATION_BACKENDS = ["users.backends.PooledModelBackend"]
+
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)
+)
+PASSWORD_HASH_QUEUE_SIZE = 64
+PASSWORD_HASH_QUEUE_TIMEOUT = 5
+
 LANGUAGE_CODE = "en-us"
 
 TIME_ZONE = "Europe/Moscow"
@@ -138,22 +162,37 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.StatelessJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.BasicAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "config.renderers.ORJSONRenderer",
+        "config.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "config.parsers.ORJSONParser",
+        "config.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination."
-    "PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "config.pagination.KeysetPagination",
     "PAGE_SIZE": 4,
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=10),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": (
+        "users.serializers.UserTokenObtainPairSerializer"
+    ),
+    "TOKEN_REFRESH_SERIALIZER": (
+        "users.serializers.UserTokenRefreshSerializer"
+    ),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -179,11 +218,33 @@ if CACHE_ENABLED:
         "default": {
             "BACKEND": "django.core.cache.backends.redis.RedisCache",
             "LOCATION": os.getenv("REDIS_URL"),
-            "OPTIONS": {
-                "CLIENT_CLASS": "django_redis.client.DefaultClient",
-            },
         }
     }
+
+ANSWER_KEY_CACHE_SIZE = 1024
+ANSWER_KEY_CACHE_TIMEOUT = 60 * 60
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+COURSE_ACCESS_CACHE_TIMEOUT = 60 * 60
+USER_CACHE_TIMEOUT = 60 * 10
+GRADEBOOK_CACHE_TIMEOUT = 60 * 60
+ITEM_ANALYSIS_CACHE_TIMEOUT = 60 * 60 * 24
+
+SUBMIT_ASYNC = os.getenv("SUBMIT_ASYNC") == "True"
+GRADING_BATCH_SIZE = 200
+
+REGRADE_INLINE_LIMIT = 1000
+REGRADE_CHUNK_SIZE = 5000
+
+STREAM_CHUNK_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+ITEM_ANALYSIS_CHUNK_SIZE = 20000
+
+LEADERBOARD_SIZE = 10
+LEADERBOARD_MAX_SIZE = 100
+
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -0,0 +1,78 @@
+import orjson
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from loguru import logger
+
+from .renderers import ORJSON_OPTIONS, encode_default
+
+STREAM_CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class StreamingListMixin:
+    """
+    Миксин ViewSet: потоковая выдача списка без пагинации.
+    Включается параметром ?stream=json (JSON-массив) или ?stream=ndjson
+    (объект на строку). Строки читаются курсором на сервере БД пачками
+    по STREAM_CHUNK_SIZE, каждая пачка сериализуется и сразу отправляется,
+    поэтому память не зависит от числа строк.
+    """
+
+    stream_query_param = "stream"
+
+    def get_stream_format(self, request):
+        stream_format = request.query_params.get(self.stream_query_param)
+        if stream_format in STREAM_CONTENT_TYPES:
+            return stream_format
+        return None
+
+    def list(self, request, *args, **kwargs):
+        stream_format = self.get_stream_format(request)
+        if stream_format is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self, "cursor_ordering", None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        logger.info(
+            f"Потоковая выдача {queryset.model.__name__} в формате"
+            f" {stream_format} для {request.user}"
+        )
+        return StreamingHttpResponse(
+            self.stream_rows(queryset, stream_format),
+            content_type=STREAM_CONTENT_TYPES[stream_format],
+        )
+
+    def iter_batches(self, queryset):
+        chunk_size = settings.STREAM_CHUNK_SIZE
+        batch = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            batch.append(obj)
+            if len(batch) == chunk_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def stream_rows(self, queryset, stream_format):
+        as_array = stream_format == "json"
+        if as_array:
+            yield b"["
+        separator = b""
+        for batch in self.iter_batches(queryset):
+            rows = [
+                orjson.dumps(
+                    item, default=encode_default, option=ORJSON_OPTIONS
+                )
+                for item in self.get_serializer(batch, many=True).data
+            ]
+            if as_array:
+                yield separator + b",".join(rows)
+                separator = b","
+            else:
+                yield b"\n".join(rows) + b"\n"
+        if as_array:
+            yield b"]"
@@ -0,0 +1,153 @@
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import bump_version, get_version
+from .models import Course, Test
+
+
+class CourseAccess(NamedTuple):
+    """id курсов пользователя: созданных им и тех, на которые он записан"""
+
+    owned: frozenset
+    enrolled: frozenset
+
+
+def access_key(user_id, version):
+    return f"course_access:{user_id}:{version}"
+
+
+def load_course_access(user_id):
+    """
+    Читает id курсов пользователя из общего кэша или из БД.
+    Версия берется до чтения из БД: если доступ изменится во время
+    чтения, устаревшее значение попадет под старый ключ и не будет
+    прочитано.
+    """
+    key = access_key(user_id, get_version("course_access", user_id))
+    access = cache.get(key)
+    if access is None:
+        access = CourseAccess(
+            owned=frozenset(
+                Course.objects.filter(owner_id=user_id).values_list(
+                    "pk", flat=True
+                )
+            ),
+            enrolled=frozenset(
+                Course.students.through.objects.filter(
+                    user_id=user_id
+                ).values_list("course_id", flat=True)
+            ),
+        )
+        cache.set(key, access, timeout=settings.COURSE_ACCESS_CACHE_TIMEOUT)
+    return access
+
+
+def get_course_access(request):
+    """
+    Доступ текущего пользователя к курсам.
+    Загружается один раз за запрос, повторные проверки прав в том же
+    запросе обращаются к сохраненному в request значению.
+    """
+    access = getattr(request, "_course_access", None)
+    if access is None:
+        access = load_course_access(request.user.pk)
+        request._course_access = access
+    return access
+
+
+def invalidate_course_access(*user_ids):
+    """Сбрасывает кэш доступа пользователей к курсам сменой версии"""
+    for user_id in user_ids:
+        if user_id is not None:
+            bump_version("course_access", user_id)
+
+
+def course_id_of(obj):
+    """id курса, к которому относится объект"""
+    if isinstance(obj, Course):
+        return obj.pk
+    if hasattr(obj, "course_id"):
+        return obj.course_id
+    for parent in ("material", "test", "question"):
+        if hasattr(obj, f"{parent}_id"):
+            return course_id_of(getattr(obj, parent))
+    return None
+
+
+def test_course_id(test_id):
+    """
+    id курса теста из общего кэша, None если теста нет.
+    Ключ включает версию теста, которая меняется при его переносе.
+    """
+    key = f"test_course:{test_id}:{get_version('test', test_id)}"
+    course_id = cache.get(key)
+    if course_id is None:
+        course_id = (
+            Test.objects.filter(pk=test_id)
+            .values_list("course_id", flat=True)
+            .first()
+        )
+        if course_id is not None:
+            cache.set(
+                key, course_id, timeout=settings.COURSE_ACCESS_CACHE_TIMEOUT
+            )
+    return course_id
+
+
+def course_exists(course_id):
+    """
+    Есть ли курс, по общему кэшу.
+    Ключ включает версию курса, которая меняется при его удалении.
+    """
+    key = f"course_exists:{course_id}:{get_version('course', course_id)}"
+    if cache.get(key):
+        return True
+    exists = Course.objects.filter(pk=course_id).exists()
+    if exists:
+        cache.set(key, True, timeout=settings.COURSE_ACCESS_CACHE_TIMEOUT)
+    return exists
+
+
+def scope_by_course(queryset, user, field="course", students=True):
+    """
+    Ограничивает queryset курсами пользователя подзапросом в SQL:
+    студенту - курсы, на которые он записан, преподавателю - его курсы,
+    администратору - все. При students=False студент получает пустой
+    список.
+    """
+    if user.role == "admin":
+        return queryset
+    if user.role == "teacher":
+        courses = Course.objects.filter(owner_id=user.pk).values("pk")
+    elif user.role == "student" and students:
+        courses = Course.students.through.objects.filter(
+            user_id=user.pk
+        ).values("course_id")
+    else:
+        return queryset.none()
+    return queryset.filter(**{f"{field}__in": courses})
+
+
+class CourseScopeMixin:
+    """
+    Миксин ViewSet: списки содержат только объекты курсов пользователя.
+    course_scope_students = False закрывает список от студентов так же,
+    как их закрывают права на объект.
+    """
+
+    course_scope_field = "course"
+    course_scope_students = True
+    scoped_actions = ("list",)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.scoped_actions:
+            queryset = scope_by_course(
+                queryset,
+                self.request.user,
+                self.course_scope_field,
+                students=self.course_scope_students,
+            )
+        return queryset
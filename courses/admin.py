@@ -2,13 +2,18 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
+from .export import export_response
+from .grading import delete_results
 from .models import (
     Answer,
     Course,
     Material,
     Question,
+    Submission,
     Test,
+    TestAttempt,
     TestResult,
+    TestStatistics,
     UserAnswer,
 )
 
@@ -73,7 +78,7 @@ class TestAdmin(admin.ModelAdmin):
         "passing_score",
         "questions_count",
     )
-    list_filter = ("material__course",)
+    list_filter = ("course",)
     search_fields = ("title", "description")
     inlines = [QuestionInline]
 
@@ -95,7 +100,7 @@ class TestAdmin(admin.ModelAdmin):
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ("text", "test_link", "order")
-    list_filter = ("test__material__course",)
+    list_filter = ("course",)
     search_fields = ("text",)
     list_editable = ("order",)
     inlines = [AnswerInline]
@@ -113,7 +118,7 @@ class QuestionAdmin(admin.ModelAdmin):
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
     list_display = ("text", "is_correct", "question_link")
-    list_filter = ("question__test__material__course", "is_correct")
+    list_filter = ("course", "is_correct")
     search_fields = ("text",)
     list_editable = ("is_correct",)
 
@@ -129,8 +134,15 @@ class AnswerAdmin(admin.ModelAdmin):
 
 class UserAnswerInline(admin.TabularInline):
     model = UserAnswer
+    fk_name = "test_result"
     extra = 0
-    readonly_fields = ("question", "answer")
+    readonly_fields = ("attempt", "question", "answer")
+
+
+class TestAttemptInline(admin.TabularInline):
+    model = TestAttempt
+    extra = 0
+    readonly_fields = ("score", "is_passed", "completed_at")
 
 
 @admin.register(TestResult)
@@ -142,7 +154,7 @@ class TestResultAdmin(admin.ModelAdmin):
         "passed_status",
         "completed_at",
     )
-    list_filter = ("test__material__course", "completed_at")
+    list_filter = ("test__course", "completed_at")
     search_fields = ("user__username", "test__title")
     readonly_fields = (
         "user",
@@ -150,8 +162,13 @@ class TestResultAdmin(admin.ModelAdmin):
         "score",
         "completed_at",
         "passed_status",
+        "best_score",
+        "attempts_count",
     )
-    inlines = [UserAnswerInline]
+    exclude = ("latest_attempt", "best_attempt")
+    inlines = [TestAttemptInline, UserAnswerInline]
+    list_select_related = ("user", "test")
+    actions = ["export_csv", "export_xlsx"]
 
     def test_link(self, obj):
         return format_html(
@@ -168,6 +185,64 @@ class TestResultAdmin(admin.ModelAdmin):
     passed_status.boolean = True
     passed_status.short_description = "Passed"
 
+    def delete_model(self, request, obj):
+        delete_results(TestResult.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_results(queryset)
+
+    def export_csv(self, request, queryset):
+        return export_response(queryset, "csv")
+
+    export_csv.short_description = "Export selected results to CSV"
+
+    def export_xlsx(self, request, queryset):
+        return export_response(queryset, "xlsx")
+
+    export_xlsx.short_description = "Export selected results to XLSX"
+
+
+@admin.register(TestStatistics)
+class TestStatisticsAdmin(admin.ModelAdmin):
+    list_display = (
+        "test",
+        "results_count",
+        "attempts_count",
+        "pass_rate_percent",
+        "mean_score",
+        "updated_at",
+    )
+    list_filter = ("test__course",)
+    list_select_related = ("test",)
+    search_fields = ("test__title",)
+    readonly_fields = (
+        "test",
+        "results_count",
+        "attempts_count",
+        "passed_count",
+        "score_sum",
+        "score_square_sum",
+        "histogram",
+        "updated_at",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def pass_rate_percent(self, obj):
+        if obj.pass_rate is None:
+            return "-"
+        return f"{obj.pass_rate:.0%}"
+
+    pass_rate_percent.short_description = "Pass rate"
+
+    def mean_score(self, obj):
+        if obj.mean is None:
+            return "-"
+        return f"{obj.mean:.1f}"
+
+    mean_score.short_description = "Mean score"
+
 
 @admin.register(UserAnswer)
 class UserAnswerAdmin(admin.ModelAdmin):
@@ -177,8 +252,8 @@ class UserAnswerAdmin(admin.ModelAdmin):
         "answer_text",
         "is_correct",
     )
-    list_filter = ("test_result__test__material__course",)
-    readonly_fields = ("test_result", "question", "answer")
+    list_filter = ("question__course",)
+    readonly_fields = ("test_result", "attempt", "question", "answer")
 
     def test_result_link(self, obj):
         return format_html(
@@ -204,3 +279,23 @@ class UserAnswerAdmin(admin.ModelAdmin):
 
     is_correct.boolean = True
     is_correct.short_description = "Correct?"
+
+
+@admin.register(Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "test", "status", "score", "created_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("user__username", "test__title")
+    readonly_fields = (
+        "user",
+        "test",
+        "user_answers",
+        "test_result",
+        "score",
+        "is_passed",
+        "correct_answers",
+        "total_questions",
+        "error",
+        "created_at",
+        "processed_at",
+    )
@@ -0,0 +1,212 @@
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from loguru import logger
+
+from .cache import get_version
+from .grading import ANSWER_KEY_NAMESPACE, RESULTS_NAMESPACE
+from .models import Answer, Question, TestResult, UserAnswer
+
+EASY_P_VALUE = 0.9
+HARD_P_VALUE = 0.2
+LOW_DISCRIMINATION = 0.2
+
+
+def _load_columns(queryset, columns, chunk_size):
+    """
+    Читает values_list частями по chunk_size строк и складывает каждую
+    часть в массив NumPy. Возвращает матрицу строки x columns.
+    """
+    rows = queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+    chunks = []
+    while chunk := list(islice(rows, chunk_size)):
+        chunks.append(np.array(chunk, dtype=np.int64))
+    if not chunks:
+        return np.empty((0, len(columns)), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def _ratio(numerator, denominator):
+    """Поэлементное деление, nan там, где знаменатель равен нулю"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def _number(value, digits=4):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def _flags(p_value, discrimination, rates, is_correct):
+    flags = []
+    if p_value >= EASY_P_VALUE:
+        flags.append("too_easy")
+    elif p_value <= HARD_P_VALUE:
+        flags.append("too_hard")
+    if discrimination < 0:
+        flags.append("negative_discrimination")
+    elif discrimination < LOW_DISCRIMINATION:
+        flags.append("low_discrimination")
+    if not is_correct.any():
+        flags.append("no_correct_answer")
+    elif (~is_correct).any() and (
+        rates[~is_correct].max() > rates[is_correct].max()
+    ):
+        flags.append("distractor_beats_key")
+    return flags
+
+
+def analyse_test(test_id, chunk_size=None):
+    """
+    Анализ вопросов теста по последним попыткам всех результатов.
+    Для каждого вопроса считаются:
+    p_value - доля ответивших правильно (пропуск считается ошибкой),
+    discrimination - точечно-бисериальная корреляция правильности ответа
+    с числом правильных ответов на остальные вопросы,
+    omitted - доля пропустивших вопрос,
+    и доля выбравших каждый вариант ответа.
+    """
+    chunk_size = chunk_size or settings.ITEM_ANALYSIS_CHUNK_SIZE
+    questions = list(
+        Question.objects.filter(test_id=test_id)
+        .order_by("order", "id")
+        .values("id", "text")
+    )
+    answers = _load_columns(
+        Answer.objects.filter(question__test_id=test_id).order_by("id"),
+        ("id", "question_id", "is_correct"),
+        chunk_size,
+    )
+    attempts = _load_columns(
+        TestResult.objects.filter(
+            test_id=test_id, latest_attempt__isnull=False
+        ).order_by("latest_attempt_id"),
+        ("latest_attempt_id",),
+        chunk_size,
+    )[:, 0]
+    responses = _load_columns(
+        UserAnswer.objects.filter(
+            test_result__test_id=test_id,
+            attempt_id=F("test_result__latest_attempt_id"),
+        ).order_by(),
+        ("attempt_id", "question_id", "answer_id"),
+        chunk_size,
+    )
+
+    question_ids = np.array([q["id"] for q in questions], dtype=np.int64)
+    question_order = np.argsort(question_ids)
+    sorted_question_ids = question_ids[question_order]
+    examinees = len(attempts)
+    # Ответы на вопросы, перенесенные в другой тест, не учитываются
+    responses = responses[
+        np.isin(responses[:, 1], question_ids)
+        & np.isin(responses[:, 2], answers[:, 0])
+    ]
+
+    # Индексы строк ответов: попытка, вопрос в порядке вывода, вариант
+    row = np.searchsorted(attempts, responses[:, 0])
+    item = question_order[
+        np.searchsorted(sorted_question_ids, responses[:, 1])
+    ]
+    option = np.searchsorted(answers[:, 0], responses[:, 2])
+    correct = answers[option, 2].astype(np.float64)
+
+    # Число правильных ответов каждого студента
+    total = np.bincount(row, weights=correct, minlength=examinees)
+    total_mean = total.mean() if examinees else np.nan
+    total_var = total.var() if examinees else np.nan
+
+    answered = np.bincount(item, minlength=len(questions))
+    right = np.bincount(item, weights=correct, minlength=len(questions))
+    p_value = _ratio(right, examinees)
+    item_var = p_value * (1 - p_value)
+    # cov(x, T) = E[xT] - E[x]E[T]; для остатка T - x:
+    # cov(x, T - x) = cov(x, T) - var(x),
+    # var(T - x) = var(T) - 2 cov(x, T) + var(x)
+    covariance = (
+        _ratio(
+            np.bincount(
+                item, weights=correct * total[row], minlength=len(questions)
+            ),
+            examinees,
+        )
+        - p_value * total_mean
+    )
+    rest_var = total_var - 2 * covariance + item_var
+    discrimination = _ratio(
+        covariance - item_var, np.sqrt(np.maximum(item_var * rest_var, 0))
+    )
+    omitted = 1 - _ratio(answered, examinees)
+    option_rate = _ratio(
+        np.bincount(option, minlength=len(answers)), examinees
+    )
+
+    report = []
+    for index, question in enumerate(questions):
+        own = answers[:, 1] == question["id"]
+        rates = option_rate[own]
+        is_correct = answers[own, 2].astype(bool)
+        report.append(
+            {
+                "id": question["id"],
+                "text": question["text"],
+                "p_value": _number(p_value[index]),
+                "discrimination": _number(discrimination[index]),
+                "omitted": _number(omitted[index]),
+                "answers": [
+                    {
+                        "id": int(answer_id),
+                        "is_correct": bool(flag),
+                        "rate": _number(rate),
+                    }
+                    for answer_id, flag, rate in zip(
+                        answers[own, 0], is_correct, rates
+                    )
+                ],
+                "flags": (
+                    _flags(
+                        p_value[index],
+                        discrimination[index],
+                        np.nan_to_num(rates),
+                        is_correct,
+                    )
+                    if examinees
+                    else []
+                ),
+            }
+        )
+    logger.info(
+        f"Анализ вопросов теста {test_id}: {examinees} результатов,"
+        f" {len(responses)} ответов"
+    )
+    return {
+        "test": test_id,
+        "results": examinees,
+        "responses": len(responses),
+        "mean_correct": _number(total_mean),
+        "questions": report,
+    }
+
+
+def _analysis_key(test_id):
+    """
+    Ключ зависит от версии результатов теста (сдача, пересчет) и версии
+    ключа ответов (вопросы и варианты)
+    """
+    return (
+        f"item_analysis:{test_id}"
+        f":{get_version(RESULTS_NAMESPACE, test_id)}"
+        f":{get_version(ANSWER_KEY_NAMESPACE, test_id)}"
+    )
+
+
+def get_item_analysis(test_id):
+    """Анализ вопросов теста из кэша, при промахе - рассчитанный заново"""
+    key = _analysis_key(test_id)
+    analysis = cache.get(key)
+    if analysis is None:
+        analysis = analyse_test(test_id)
+        cache.set(key, analysis, timeout=settings.ITEM_ANALYSIS_CACHE_TIMEOUT)
+    return analysis
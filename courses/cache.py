@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш в памяти процесса.
+    При превышении maxsize вытесняется давно не использованный элемент.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def version_key(namespace, pk):
+    """Ключ счетчика версии объекта в общем кэше"""
+    return f"{namespace}:version:{pk}"
+
+
+def get_version(namespace, pk):
+    """
+    Текущая версия объекта.
+    Начальное значение берется из времени, чтобы после очистки кэша
+    версия не совпала с ранее выданной.
+    """
+    key = version_key(namespace, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace, pk):
+    """Увеличивает версию объекта, делая устаревшими все ключи с ней"""
+    key = version_key(namespace, pk)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_versions(namespace, pks):
+    """Текущие версии нескольких объектов одним запросом к кэшу"""
+    keys = {version_key(namespace, pk): pk for pk in pks}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, pk in keys.items():
+        if pk not in versions:
+            versions[pk] = get_version(namespace, pk)
+    return versions
@@ -0,0 +1,193 @@
+import csv
+import time
+from typing import NamedTuple
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from loguru import logger
+
+from .access import test_course_id
+from .grading import GradeResult, save_results
+
+User = get_user_model()
+
+
+class CohortReport(NamedTuple):
+    """Отчет о проверке ответов группы студентов"""
+
+    students: int
+    graded: int
+    passed: int
+    unknown_users: list
+    grading_seconds: float
+    total_seconds: float
+
+    @property
+    def throughput(self):
+        """Студентов в секунду, включая сохранение"""
+        if not self.total_seconds:
+            return float(self.graded)
+        return self.graded / self.total_seconds
+
+    def as_dict(self):
+        return {
+            "students": self.students,
+            "graded": self.graded,
+            "passed": self.passed,
+            "unknown_users": self.unknown_users,
+            "grading_seconds": round(self.grading_seconds, 4),
+            "total_seconds": round(self.total_seconds, 4),
+            "students_per_second": round(self.throughput, 1),
+        }
+
+
+def read_response_matrix(lines):
+    """
+    Читает CSV с ответами группы.
+    Первая строка: "email" и id вопросов, далее по строке на студента
+    с id выбранных ответов (пустая ячейка - нет ответа).
+    Возвращает (emails, question_ids, answers) где answers - матрица
+    студенты x вопросы. Если email повторяется, учитывается последняя
+    строка с ним.
+    """
+    reader = csv.reader(lines)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise ValueError("Файл с ответами пуст")
+    try:
+        question_ids = np.array([int(value) for value in header[1:]])
+    except ValueError:
+        raise ValueError("Заголовок должен содержать id вопросов")
+    if len(np.unique(question_ids)) != len(question_ids):
+        raise ValueError("Вопросы в заголовке повторяются")
+
+    rows = {}
+    for line_number, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        email = row[0].strip()
+        try:
+            values = [
+                int(value) if value.strip() else 0
+                for value in row[1 : len(question_ids) + 1]
+            ] + [0] * (len(question_ids) + 1 - len(row))
+        except ValueError:
+            raise ValueError(f"Некорректный id ответа в строке {line_number}")
+        if email in rows:
+            logger.warning(
+                f"Повтор {email} в строке {line_number}, "
+                f"учитывается последняя строка"
+            )
+        rows[email] = values
+
+    emails = list(rows)
+    answers = np.array(list(rows.values()), dtype=np.int64).reshape(
+        len(rows), len(question_ids)
+    )
+    return emails, question_ids, answers
+
+
+def grade_matrix(answer_key, question_ids, answers):
+    """
+    Векторная проверка матрицы ответов по ключу.
+    Возвращает (scores, correct_answers, valid) - оценки и число
+    правильных ответов студентов, а также маску ответов, относящихся
+    к своим вопросам теста.
+    Оценка считается так же, как в TestViewSet.submit.
+    """
+    answer_ids = np.fromiter(answer_key.answers, dtype=np.int64)
+    if not len(answer_ids) or not answers.size:
+        zeros = np.zeros(len(answers), dtype=np.int64)
+        return zeros, zeros, np.zeros(answers.shape, dtype=bool)
+    order = np.argsort(answer_ids)
+    answer_ids = answer_ids[order]
+    entries = list(answer_key.answers.values())
+    answer_questions = np.array([entry[0] for entry in entries])[order]
+    answer_correct = np.array([entry[1] for entry in entries])[order]
+
+    positions = np.searchsorted(answer_ids, answers).clip(
+        0, len(answer_ids) - 1
+    )
+    valid = (answer_ids[positions] == answers) & (
+        answer_questions[positions] == question_ids
+    )
+    correct_answers = (valid & answer_correct[positions]).sum(axis=1)
+
+    if answer_key.total_questions > 0:
+        scores = np.trunc(
+            (correct_answers / answer_key.total_questions) * 100
+        ).astype(np.int64)
+    else:
+        scores = np.zeros(len(answers), dtype=np.int64)
+    return scores, correct_answers, valid
+
+
+def grade_cohort(answer_key, lines, batch_size=500):
+    """
+    Проверяет и сохраняет ответы группы студентов по одному тесту.
+    Оцениваются только студенты, записанные на курс теста, остальные
+    адреса попадают в unknown_users. Результаты пишутся пачками
+    через save_results.
+    """
+    started = time.perf_counter()
+    emails, question_ids, answers = read_response_matrix(lines)
+    scores, correct_answers, valid = grade_matrix(
+        answer_key, question_ids, answers
+    )
+    passed = scores >= answer_key.passing_score
+    grading_seconds = time.perf_counter() - started
+
+    user_ids = dict(
+        User.objects.filter(
+            email__in=emails,
+            role="student",
+            enrolled_courses=test_course_id(answer_key.test_id),
+        ).values_list("email", "id")
+    )
+    known = np.array([email in user_ids for email in emails], dtype=bool)
+    unknown_users = [email for email in emails if email not in user_ids]
+
+    entries = []
+    graded = 0
+    for row in np.flatnonzero(known):
+        user_id = user_ids[emails[row]]
+        columns = np.flatnonzero(valid[row])
+        entries.append(
+            (
+                user_id,
+                answer_key.test_id,
+                GradeResult(
+                    score=int(scores[row]),
+                    passed=bool(passed[row]),
+                    correct_answers=int(correct_answers[row]),
+                    total_questions=answer_key.total_questions,
+                    valid_answers=dict(
+                        zip(
+                            question_ids[columns].tolist(),
+                            answers[row, columns].tolist(),
+                        )
+                    ),
+                ),
+            )
+        )
+        if len(entries) >= batch_size:
+            graded += len(save_results(entries))
+            entries = []
+    if entries:
+        graded += len(save_results(entries))
+
+    report = CohortReport(
+        students=len(emails),
+        graded=graded,
+        passed=int(passed[known].sum()),
+        unknown_users=unknown_users,
+        grading_seconds=grading_seconds,
+        total_seconds=time.perf_counter() - started,
+    )
+    logger.info(
+        f"Проверены ответы группы по тесту {answer_key.test_id}: "
+        f"{report.graded}/{report.students} студентов, "
+        f"{report.throughput:.1f} студентов/с"
+    )
+    return report
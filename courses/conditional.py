@@ -0,0 +1,65 @@
+import hashlib
+
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import get_version
+
+VARY_HEADERS = ("Accept", "Authorization", "Cookie")
+
+
+class ConditionalRetrieveMixin:
+    """
+    Миксин ViewSet: retrieve отдает ETag и отвечает 304 на If-None-Match.
+    ETag строится из updated_at и счетчика версии объекта без
+    сериализации тела, поэтому повторное чтение стоит одного легкого
+    запроса с проверкой прав.
+    """
+
+    etag_namespace = None
+    etag_select_related = ()
+
+    def get_etag_object(self):
+        """Объект без загрузки связей, нужных только сериализатору"""
+        queryset = self.get_queryset().prefetch_related(None)
+        if self.etag_select_related:
+            queryset = queryset.select_related(*self.etag_select_related)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def get_etag(self, obj):
+        request = self.request
+        updated_at = getattr(obj, "updated_at", None)
+        parts = (
+            obj._meta.label,
+            obj.pk,
+            updated_at.isoformat() if updated_at else "",
+            get_version(self.etag_namespace, obj.pk),
+            getattr(request.user, "role", ""),
+            request.accepted_renderer.format,
+            sorted(request.query_params.lists()),
+        )
+        digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return f'"{digest}"'
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_etag(self.get_etag_object())
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        matched = "*" in if_none_match or etag in [
+            tag.removeprefix("W/") for tag in if_none_match
+        ]
+        if matched:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+        response["ETag"] = etag
+        patch_vary_headers(response, VARY_HEADERS)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,200 @@
+import csv
+import io
+import tempfile
+from datetime import datetime, time, timedelta
+
+import xlsxwriter
+from django.conf import settings
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from loguru import logger
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer
+
+from config.renderers import ORJSONRenderer
+
+EXPORT_COLUMNS = (
+    ("id", "result_id"),
+    ("user_id", "user_id"),
+    ("user__email", "email"),
+    ("user__username", "username"),
+    ("test__course_id", "course_id"),
+    ("test__course__title", "course"),
+    ("test_id", "test_id"),
+    ("test__title", "test"),
+    ("score", "score"),
+    ("is_passed", "passed"),
+    ("best_score", "best_score"),
+    ("attempts_count", "attempts"),
+    ("completed_at", "completed_at"),
+)
+XLSX_MAX_ROWS = 1048576
+XLSX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+)
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+class _ExportRenderer(BaseRenderer):
+    """
+    Формат выгрузки для согласования содержимого.
+    Сама выгрузка отдается потоком в обход рендерера, через него
+    проходят только ошибки - они отдаются в JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ORJSONRenderer().render(data)
+
+
+class ResultsCSVRenderer(_ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+
+class ResultsXLSXRenderer(_ExportRenderer):
+    media_type = XLSX_CONTENT_TYPE
+    format = "xlsx"
+    charset = None
+
+
+def _day_start(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ValidationError({name: "Ожидается дата в формате ГГГГ-ММ-ДД"})
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _positive_int(value, name):
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise ValidationError({name: "Ожидается id"})
+    return number
+
+
+def export_filters(params):
+    """
+    Фильтры выгрузки из параметров запроса: course, test, date_from
+    и date_to (включительно) по дате первой сдачи результата
+    """
+    filters = {}
+    if params.get("course"):
+        filters["test__course_id"] = _positive_int(params["course"], "course")
+    if params.get("test"):
+        filters["test_id"] = _positive_int(params["test"], "test")
+    if params.get("date_from"):
+        filters["completed_at__gte"] = _day_start(
+            params["date_from"], "date_from"
+        )
+    if params.get("date_to"):
+        filters["completed_at__lt"] = _day_start(
+            params["date_to"], "date_to"
+        ) + timedelta(days=1)
+    return filters
+
+
+def export_rows(queryset):
+    """
+    Строки выгрузки кортежами, без создания объектов моделей.
+    Пользователь, тест и курс присоединяются в том же запросе,
+    строки читаются курсором на сервере БД пачками по EXPORT_CHUNK_SIZE.
+    """
+    return (
+        queryset.order_by("pk")
+        .values_list(
+            *(column for column, _ in EXPORT_COLUMNS),
+            Coalesce("latest_attempt__completed_at", "completed_at"),
+        )
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+
+def export_header():
+    return [title for _, title in EXPORT_COLUMNS] + ["last_attempt_at"]
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value.encode()
+
+
+def stream_csv(queryset):
+    """
+    CSV по частям: заголовок отдается до запроса к БД, чтобы загрузка
+    началась сразу, затем по части на EXPORT_CHUNK_SIZE строк
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_header())
+    yield _drain(buffer)
+    rows = 0
+    for row in export_rows(queryset):
+        writer.writerow(row)
+        rows += 1
+        if rows % settings.EXPORT_CHUNK_SIZE == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+    logger.info(f"Выгрузка результатов в CSV: {rows} строк")
+
+
+def _add_sheet(workbook, number, bold):
+    name = "Results" if number == 1 else f"Results {number}"
+    sheet = workbook.add_worksheet(name)
+    sheet.write_row(0, 0, export_header(), bold)
+    return sheet
+
+
+def stream_xlsx(queryset):
+    """
+    XLSX в режиме constant_memory: строки пишутся во временные файлы
+    xlsxwriter по мере чтения, книга собирается во временный файл,
+    который затем отдается частями. После XLSX_MAX_ROWS строк
+    начинается новый лист.
+    """
+    with tempfile.TemporaryFile() as output:
+        workbook = xlsxwriter.Workbook(
+            output,
+            {
+                "constant_memory": True,
+                "remove_timezone": True,
+                "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            },
+        )
+        bold = workbook.add_format({"bold": True})
+        sheets = 1
+        sheet, row_number = _add_sheet(workbook, sheets, bold), 1
+        rows = 0
+        for row in export_rows(queryset):
+            if row_number == XLSX_MAX_ROWS:
+                sheets += 1
+                sheet, row_number = _add_sheet(workbook, sheets, bold), 1
+            sheet.write_row(row_number, 0, row)
+            row_number += 1
+            rows += 1
+        workbook.close()
+        logger.info(f"Выгрузка результатов в XLSX: {rows} строк")
+        output.seek(0)
+        while chunk := output.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def export_response(queryset, export_format):
+    """Потоковый ответ с выгрузкой результатов в CSV или XLSX"""
+    filename = f"test-results-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+    if export_format == "xlsx":
+        response = StreamingHttpResponse(
+            stream_xlsx(queryset), content_type=XLSX_CONTENT_TYPE
+        )
+    else:
+        response = StreamingHttpResponse(
+            stream_csv(queryset), content_type="text/csv; charset=utf-8"
+        )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,91 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from rest_framework import serializers
+
+from .cache import get_version, get_versions
+
+
+def _field_tree(serializer):
+    names = []
+    for name, field in serializer.fields.items():
+        if isinstance(field, serializers.ListSerializer):
+            names.append((name, _field_tree(field.child)))
+        elif isinstance(field, serializers.BaseSerializer):
+            names.append((name, _field_tree(field)))
+        else:
+            names.append(name)
+    return tuple(names)
+
+
+class FragmentCacheMixin:
+    """
+    Миксин сериализатора с кэшированием готового представления объекта.
+    Ключ фрагмента состоит из id объекта, его версии и набора полей,
+    версия увеличивается при изменении объекта или его потомков
+    (см. signals.py), поэтому устаревшие фрагменты просто не читаются.
+    """
+
+    fragment_namespace = None
+
+    def fragment_key(self, pk, version):
+        signature = getattr(self, "_fragment_signature", None)
+        if signature is None:
+            signature = hashlib.md5(
+                repr(_field_tree(self)).encode()
+            ).hexdigest()[:12]
+            self._fragment_signature = signature
+        return f"fragment:{self.fragment_namespace}:{pk}:{version}:{signature}"
+
+    def render(self, instance):
+        """Представление объекта без обращения к кэшу"""
+        return super().to_representation(instance)
+
+    def to_representation(self, instance):
+        key = self.fragment_key(
+            instance.pk, get_version(self.fragment_namespace, instance.pk)
+        )
+        data = cache.get(key)
+        if data is None:
+            data = self.render(instance)
+            cache.set(key, data, timeout=settings.FRAGMENT_CACHE_TIMEOUT)
+        return data
+
+
+class FragmentListSerializer(serializers.ListSerializer):
+    """
+    Список с кэшированием фрагментов: версии и готовые фрагменты всех
+    элементов читаются из кэша пачкой, сериализуются только промахи
+    """
+
+    def to_representation(self, data):
+        iterable = (
+            data.all()
+            if isinstance(data, models.manager.BaseManager)
+            else data
+        )
+        items = list(iterable)
+        if not items:
+            return []
+        child = self.child
+        versions = get_versions(
+            child.fragment_namespace, [item.pk for item in items]
+        )
+        keys = [
+            child.fragment_key(item.pk, versions[item.pk]) for item in items
+        ]
+        cached = cache.get_many(keys)
+
+        missing = {}
+        representation = []
+        for item, key in zip(items, keys):
+            fragment = cached.get(key)
+            if fragment is None:
+                fragment = child.render(item)
+                missing[key] = fragment
+            representation.append(fragment)
+        if missing:
+            cache.set_many(missing, timeout=settings.FRAGMENT_CACHE_TIMEOUT)
+        return representation
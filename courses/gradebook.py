@@ -0,0 +1,171 @@
+import csv
+import hashlib
+import io
+from itertools import repeat
+
+import orjson
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
+from rest_framework.renderers import BaseRenderer
+
+from config.renderers import ORJSON_OPTIONS, ORJSONRenderer
+
+from .cache import get_version, get_versions
+from .grading import RESULTS_NAMESPACE
+from .models import Test, TestResult
+
+User = get_user_model()
+
+GRADEBOOK_FIELDS = ("score", "passed", "completed_at")
+
+
+def _course_tests(course_id):
+    return list(
+        Test.objects.filter(course_id=course_id)
+        .order_by("material__order", "id")
+        .values("id", "title")
+    )
+
+
+def _gradebook_key(course_id, tests):
+    """
+    Ключ собранного журнала зависит от версии курса (тесты, студенты)
+    и версий результатов всех его тестов. При промахе журнал собирается
+    из колонок тестов, заново читаются только колонки измененных тестов.
+    """
+    versions = get_versions(RESULTS_NAMESPACE, [test["id"] for test in tests])
+    signature = hashlib.md5(
+        repr(
+            (get_version("course", course_id), sorted(versions.items()))
+        ).encode()
+    ).hexdigest()
+    return f"gradebook:{course_id}:{signature}"
+
+
+def _column_key(test_id, version):
+    return f"gradebook:column:{test_id}:{version}"
+
+
+def _load_columns(test_ids):
+    """
+    Колонки журнала {test_id: {user_id: JSON ячейки}} из кэша.
+    Колонка зависит только от версии результатов своего теста, поэтому
+    после сдачи одного теста одним запросом перечитываются результаты
+    только устаревших колонок. Ячейки хранятся готовым JSON, чтобы
+    не разбирать и не сериализовать их заново при каждой сборке.
+    """
+    versions = get_versions(RESULTS_NAMESPACE, test_ids)
+    keys = {
+        _column_key(test_id, version): test_id
+        for test_id, version in versions.items()
+    }
+    columns = {
+        keys[key]: column for key, column in cache.get_many(keys).items()
+    }
+    stale = {test_id: {} for test_id in test_ids if test_id not in columns}
+    if stale:
+        results = TestResult.objects.filter(test_id__in=stale).values_list(
+            "user_id",
+            "test_id",
+            "score",
+            "is_passed",
+            Coalesce("latest_attempt__completed_at", "completed_at"),
+        )
+        for user_id, test_id, *cell in results.iterator(
+            chunk_size=settings.STREAM_CHUNK_SIZE * 10
+        ):
+            stale[test_id][user_id] = orjson.dumps(cell, option=ORJSON_OPTIONS)
+        cache.set_many(
+            {
+                _column_key(test_id, versions[test_id]): column
+                for test_id, column in stale.items()
+            },
+            timeout=settings.GRADEBOOK_CACHE_TIMEOUT,
+        )
+        columns.update(stale)
+    return columns
+
+
+def build_gradebook(course_id, tests):
+    """
+    JSON журнала: матрица студенты x тесты, ячейка -
+    [оценка, сдан, время последней попытки] или null.
+    Строки склеиваются из готовых ячеек колонок без сериализации
+    всей матрицы.
+    """
+    columns = _load_columns([test["id"] for test in tests])
+    students = list(
+        User.objects.filter(enrolled_courses=course_id)
+        .order_by("id")
+        .values("id", "email", "username")
+    )
+    user_ids = [student["id"] for student in students]
+    cells = zip(
+        *(
+            map(columns[test["id"]].get, user_ids, repeat(b"null"))
+            for test in tests
+        )
+    )
+    if not tests:
+        cells = repeat(())
+    rows = [
+        orjson.dumps(student)[:-1] + b',"results":[' + b",".join(row) + b"]}"
+        for student, row in zip(students, cells)
+    ]
+    header = orjson.dumps(
+        {"course": course_id, "fields": GRADEBOOK_FIELDS, "tests": tests}
+    )
+    return header[:-1] + b',"students":[' + b",".join(rows) + b"]}"
+
+
+def get_gradebook(course_id):
+    """
+    Журнал курса в JSON (bytes) из кэша, при промахе - собранный заново.
+    В кэше хранится готовый JSON: для ответа в JSON его не нужно ни
+    разбирать, ни рендерить заново.
+    """
+    tests = _course_tests(course_id)
+    key = _gradebook_key(course_id, tests)
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = build_gradebook(course_id, tests)
+        cache.set(key, encoded, timeout=settings.GRADEBOOK_CACHE_TIMEOUT)
+    return encoded
+
+
+class GradebookCSVRenderer(BaseRenderer):
+    """
+    CSV журнала: строка на студента, по три колонки на тест.
+    Ошибки отдаются в JSON.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or "students" not in data:
+            return ORJSONRenderer().render(data)
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(
+            ["student_id", "email", "username"]
+            + [
+                f"{test['title']} ({field})"
+                for test in data["tests"]
+                for field in data["fields"]
+            ]
+        )
+        empty = [""] * len(data["fields"])
+        for student in data["students"]:
+            writer.writerow(
+                [student["id"], student["email"], student["username"]]
+                + [
+                    value
+                    for cell in student["results"]
+                    for value in (cell or empty)
+                ]
+            )
+        return output.getvalue().encode(self.charset)
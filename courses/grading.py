@@ -0,0 +1,460 @@
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from loguru import logger
+
+from .cache import LRUCache, bump_version, get_version
+from .leaderboard import record_best_scores, remove_results
+from .models import (
+    Answer,
+    Question,
+    Submission,
+    Test,
+    TestAttempt,
+    TestResult,
+    UserAnswer,
+)
+from .statistics import lock_statistics, record_result, save_statistics
+
+ANSWER_KEY_NAMESPACE = "answer_key"
+RESULTS_NAMESPACE = "test_results"
+
+_answer_keys = LRUCache(maxsize=settings.ANSWER_KEY_CACHE_SIZE)
+
+
+class GradeResult(NamedTuple):
+    """Результат проверки ответов пользователя"""
+
+    score: int
+    passed: bool
+    correct_answers: int
+    total_questions: int
+    valid_answers: dict
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AnswerKey:
+    """
+    Скомпилированный ключ ответов теста.
+    Хранит для каждого варианта ответа id вопроса и признак правильности,
+    что позволяет проверить попытку без обращений к базе данных.
+    """
+
+    __slots__ = (
+        "test_id",
+        "version",
+        "passing_score",
+        "total_questions",
+        "answers",
+    )
+
+    def __init__(
+        self, test_id, version, passing_score, total_questions, answers
+    ):
+        self.test_id = test_id
+        self.version = version
+        self.passing_score = passing_score
+        self.total_questions = total_questions
+        self.answers = answers
+
+    @classmethod
+    def compile(cls, test_id, version):
+        """Собирает ключ из базы данных, None если теста не существует"""
+        passing_score = (
+            Test.objects.filter(pk=test_id)
+            .values_list("passing_score", flat=True)
+            .first()
+        )
+        if passing_score is None:
+            return None
+        answers = {
+            answer_id: (question_id, is_correct)
+            for answer_id, question_id, is_correct in Answer.objects.filter(
+                question__test_id=test_id
+            ).values_list("id", "question_id", "is_correct")
+        }
+        total_questions = Question.objects.filter(test_id=test_id).count()
+        logger.debug(
+            f"Скомпилирован ключ ответов теста {test_id}: "
+            f"{total_questions} вопросов, {len(answers)} ответов"
+        )
+        return cls(
+            int(test_id), version, passing_score, total_questions, answers
+        )
+
+    def lookup(self, question_id, answer_id):
+        """
+        Признак правильности ответа, None если ответ не относится
+        к вопросу этого теста
+        """
+        entry = self.answers.get(_to_int(answer_id))
+        if entry is None or entry[0] != _to_int(question_id):
+            return None
+        return entry[1]
+
+    def grade(self, user_answers):
+        """
+        Проверяет ответы пользователя по ключу.
+        Если на вопрос прислано несколько ответов, учитывается последний.
+        """
+        valid_answers = {}
+        for answer_data in user_answers:
+            question_id = answer_data.get("question")
+            answer_id = answer_data.get("answer")
+
+            if self.lookup(question_id, answer_id) is None:
+                logger.warning(
+                    f"Не найден ответ {answer_id} для вопроса {question_id}"
+                )
+                continue
+            valid_answers[int(question_id)] = int(answer_id)
+
+        correct_answers = sum(
+            self.answers[answer_id][1] for answer_id in valid_answers.values()
+        )
+        score = (
+            int((correct_answers / self.total_questions) * 100)
+            if self.total_questions > 0
+            else 0
+        )
+        return GradeResult(
+            score=score,
+            passed=score >= self.passing_score,
+            correct_answers=correct_answers,
+            total_questions=self.total_questions,
+            valid_answers=valid_answers,
+        )
+
+
+def _shared_key(test_id, version):
+    return f"{ANSWER_KEY_NAMESPACE}:{test_id}:{version}"
+
+
+def get_answer_key(test_id):
+    """
+    Ключ ответов теста.
+    Сначала ищется в LRU процесса, затем в общем кэше, и только
+    при промахе компилируется из базы данных.
+    """
+    version = get_version(ANSWER_KEY_NAMESPACE, test_id)
+    answer_key = _answer_keys.get(test_id)
+    if answer_key is not None and answer_key.version == version:
+        return answer_key
+
+    answer_key = cache.get(_shared_key(test_id, version))
+    if answer_key is None:
+        answer_key = AnswerKey.compile(test_id, version)
+        if answer_key is None:
+            return None
+        cache.set(
+            _shared_key(test_id, version),
+            answer_key,
+            timeout=settings.ANSWER_KEY_CACHE_TIMEOUT,
+        )
+    _answer_keys.set(test_id, answer_key)
+    return answer_key
+
+
+def invalidate_answer_key(test_id):
+    """Делает устаревшим ключ ответов теста во всех процессах"""
+    bump_version(ANSWER_KEY_NAMESPACE, test_id)
+    _answer_keys.pop(test_id)
+
+
+@transaction.atomic
+def results_changed(*test_ids):
+    """
+    Увеличивает версию результатов тестов сразу и повторно после коммита.
+    По ней сбрасываются кэши сводок по результатам (журнал курса и т.п.).
+    """
+    test_ids = set(test_ids)
+
+    def bump():
+        for test_id in test_ids:
+            bump_version(RESULTS_NAMESPACE, test_id)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+@transaction.atomic
+def save_results(entries):
+    """
+    Сохраняет пачку попыток за постоянное число запросов.
+    Строки TestResult пар пользователь-тест создаются при отсутствии
+    и блокируются, по ним определяются прежние оценки. Затем пакетно
+    вставляются попытки и ответы пользователей, и одним обновлением
+    записываются оценка и указатели на последнюю и лучшую попытку.
+    Прежние попытки и ответы не удаляются.
+    Строки статистики тестов блокируются последними, перед их
+    обновлением, чтобы сдачи одного теста не ждали друг друга всю
+    транзакцию. Лидерборды обновляются после коммита.
+    entries - последовательность (user_id, test_id, GradeResult), при
+    повторе пары пользователь-тест учитывается последняя запись.
+    Возвращает словарь {(user_id, test_id): TestResult}.
+    """
+    latest = {
+        (user_id, test_id): result for user_id, test_id, result in entries
+    }
+    if not latest:
+        return {}
+    test_ids = {test_id for _, test_id in latest}
+    # Новые строки вставляются с attempts_count = 0: у сохраненных
+    # результатов всегда есть хотя бы одна попытка
+    TestResult.objects.bulk_create(
+        [
+            TestResult(
+                user_id=user_id,
+                test_id=test_id,
+                score=latest[user_id, test_id].score,
+                is_passed=latest[user_id, test_id].passed,
+            )
+            for user_id, test_id in sorted(latest)
+        ],
+        ignore_conflicts=True,
+    )
+    locked = {
+        (test_result.user_id, test_result.test_id): test_result
+        for test_result in TestResult.objects.select_for_update()
+        .filter(
+            test_id__in=test_ids,
+            user_id__in={user_id for user_id, _ in latest},
+        )
+        .order_by("pk")
+        .only(
+            "user_id",
+            "test_id",
+            "score",
+            "is_passed",
+            "completed_at",
+            "best_attempt_id",
+            "best_score",
+            "attempts_count",
+        )
+    }
+    test_results = [locked[pair] for pair in latest]
+    previous = {
+        pair: (
+            test_result.score,
+            test_result.is_passed,
+            (
+                test_result.best_score
+                if test_result.best_score is not None
+                else test_result.score
+            ),
+        )
+        for pair, test_result in zip(latest, test_results)
+        if test_result.attempts_count
+    }
+
+    attempts = TestAttempt.objects.bulk_create(
+        TestAttempt(
+            test_result_id=test_result.pk,
+            score=result.score,
+            is_passed=result.passed,
+        )
+        for test_result, result in zip(test_results, latest.values())
+    )
+    UserAnswer.objects.bulk_create(
+        UserAnswer(
+            test_result_id=attempt.test_result_id,
+            attempt_id=attempt.pk,
+            question_id=question_id,
+            answer_id=answer_id,
+        )
+        for attempt, result in zip(attempts, latest.values())
+        for question_id, answer_id in result.valid_answers.items()
+    )
+
+    for test_result, attempt in zip(test_results, attempts):
+        test_result.score = attempt.score
+        test_result.is_passed = attempt.is_passed
+        test_result.latest_attempt_id = attempt.pk
+        if test_result.best_score is None or (
+            attempt.score > test_result.best_score
+        ):
+            test_result.best_attempt_id = attempt.pk
+            test_result.best_score = attempt.score
+        test_result.attempts_count += 1
+    TestResult.objects.bulk_update(
+        test_results,
+        [
+            "score",
+            "is_passed",
+            "latest_attempt",
+            "best_attempt",
+            "best_score",
+            "attempts_count",
+        ],
+    )
+
+    course_ids = dict(
+        Test.objects.filter(pk__in=test_ids).values_list("pk", "course_id")
+    )
+    leaderboard = []
+    statistics = lock_statistics(test_ids)
+    for ((user_id, test_id), result), test_result in zip(
+        latest.items(), test_results
+    ):
+        score, is_passed, best_before = previous.get(
+            (user_id, test_id), (None, None, None)
+        )
+        record_result(
+            statistics[test_id],
+            previous=None if score is None else (score, is_passed),
+            current=(result.score, result.passed),
+            attempts=1,
+        )
+        if best_before != test_result.best_score:
+            leaderboard.append(
+                (
+                    course_ids[test_id],
+                    test_id,
+                    user_id,
+                    test_result.best_score,
+                    test_result.best_score - (best_before or 0),
+                )
+            )
+    save_statistics(statistics.values())
+    record_best_scores(leaderboard)
+    results_changed(*test_ids)
+    return dict(zip(latest, test_results))
+
+
+def discard_results(results):
+    """
+    Вычитает результаты, которые сейчас будут удалены, из статистики
+    тестов (по одной блокировке строки на тест) и из лидербордов
+    (после коммита). Вызывается в транзакции удаления.
+    """
+    rows = list(
+        results.values_list(
+            "test_id",
+            "test__course_id",
+            "user_id",
+            "score",
+            "is_passed",
+            "attempts_count",
+            Coalesce("best_score", "score"),
+        )
+    )
+    if not rows:
+        return
+    statistics = lock_statistics(row[0] for row in rows)
+    for test_id, _, _, score, is_passed, attempts, _ in rows:
+        record_result(
+            statistics[test_id],
+            previous=(score, is_passed),
+            attempts=-attempts,
+        )
+    save_statistics(statistics.values())
+
+    members = {(course_id, user_id) for _, course_id, user_id, *_ in rows}
+    remaining = set(
+        TestResult.objects.filter(
+            user_id__in={user_id for _, user_id in members},
+            test__course_id__in={course_id for course_id, _ in members},
+        )
+        .exclude(pk__in=results.values("pk"))
+        .values_list("test__course_id", "user_id")
+        .distinct()
+    )
+    remove_results(
+        [
+            (course_id, test_id, user_id, best_score)
+            for test_id, course_id, user_id, *_, best_score in rows
+        ],
+        departed=members - remaining,
+    )
+    results_changed(*statistics)
+
+
+@transaction.atomic
+def delete_results(results):
+    """
+    Удаляет результаты тестов с попытками и ответами, статистика
+    и лидерборды обновляются одним проходом по удаляемым строкам.
+    Возвращает число удаленных результатов.
+    """
+    discard_results(results)
+    _, deleted = results.delete()
+    return deleted.get(TestResult._meta.label, 0)
+
+
+def save_result(user_id, test_id, result):
+    """Сохраняет результат одной попытки"""
+    return save_results([(user_id, test_id, result)])[(user_id, test_id)]
+
+
+def grade_pending_submissions(batch_size):
+    """
+    Проверяет пачку отложенных отправок.
+    Строки блокируются с SKIP LOCKED, поэтому несколько обработчиков
+    могут работать параллельно, не мешая друг другу.
+    Возвращает число обработанных отправок.
+    """
+    with transaction.atomic():
+        submissions = list(
+            Submission.objects.select_for_update(skip_locked=True)
+            .filter(status=Submission.Status.PENDING)
+            .order_by("id")[:batch_size]
+        )
+        graded = []
+        for submission in submissions:
+            answer_key = get_answer_key(submission.test_id)
+            submission.processed_at = timezone.now()
+            if answer_key is None:
+                submission.status = Submission.Status.FAILED
+                submission.error = "Тест не найден"
+                continue
+            try:
+                result = answer_key.grade(submission.user_answers)
+            except (AttributeError, TypeError, ValueError) as error:
+                logger.warning(
+                    f"Некорректные ответы в отправке {submission.id}: {error}"
+                )
+                submission.status = Submission.Status.FAILED
+                submission.error = "Некорректный формат ответов"
+                continue
+            graded.append((submission, result))
+
+        test_results = save_results(
+            (submission.user_id, submission.test_id, result)
+            for submission, result in graded
+        )
+        for submission, result in graded:
+            submission.status = Submission.Status.DONE
+            submission.test_result = test_results[
+                (submission.user_id, submission.test_id)
+            ]
+            submission.score = result.score
+            submission.is_passed = result.passed
+            submission.correct_answers = result.correct_answers
+            submission.total_questions = result.total_questions
+
+        Submission.objects.bulk_update(
+            submissions,
+            [
+                "status",
+                "test_result",
+                "score",
+                "is_passed",
+                "correct_answers",
+                "total_questions",
+                "error",
+                "processed_at",
+            ],
+        )
+    if submissions:
+        logger.info(f"Проверено отправок: {len(submissions)}")
+    return len(submissions)
@@ -0,0 +1,289 @@
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from loguru import logger
+
+from users.authentication import get_cached_users
+
+from .models import Test, TestResult
+
+
+def test_board(test_id):
+    return f"leaderboard:test:{test_id}"
+
+
+def course_board(course_id):
+    return f"leaderboard:course:{course_id}"
+
+
+class RedisLeaderboards:
+    """
+    Лидерборды в sorted set Redis из настроенного кэша.
+    Участник - id пользователя, оценка - лучшая оценка за тест
+    или сумма лучших оценок за тесты курса.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _key(self, name):
+        return self.backend.make_and_validate_key(name)
+
+    def _client(self):
+        return self.backend._cache.get_client(write=True)
+
+    def apply(self, best=(), increments=(), removals=()):
+        """
+        Обновляет лидерборды одним запросом к Redis (pipeline).
+        best - (лидерборд, участник, оценка), сохраняется максимум,
+        increments - (лидерборд, участник, прибавка),
+        removals - (лидерборд, участник).
+        """
+        pipeline = self._client().pipeline(transaction=False)
+        for name, member, score in best:
+            pipeline.zadd(self._key(name), {member: score}, gt=True)
+        for name, member, delta in increments:
+            pipeline.zincrby(self._key(name), delta, member)
+        for name, member in removals:
+            pipeline.zrem(self._key(name), member)
+        pipeline.execute()
+
+    def replace(self, name, scores, chunk_size=10000):
+        """
+        Заменяет лидерборд целиком: он собирается во временном ключе
+        и атомарно подменяет прежний через RENAME
+        """
+        key = self._key(name)
+        if not scores:
+            self._client().delete(key)
+            return
+        temporary = f"{key}:rebuild"
+        items = list(scores.items())
+        pipeline = self._client().pipeline(transaction=True)
+        pipeline.delete(temporary)
+        for start in range(0, len(items), chunk_size):
+            pipeline.zadd(temporary, dict(items[start : start + chunk_size]))
+        pipeline.rename(temporary, key)
+        pipeline.execute()
+
+    def top(self, name, limit):
+        return [
+            (int(member), int(score))
+            for member, score in self._client().zrevrange(
+                self._key(name), 0, limit - 1, withscores=True
+            )
+        ]
+
+    def rank(self, name, member):
+        """
+        (место, оценка) участника, None если его нет в лидерборде.
+        Участники с равной оценкой делят место.
+        """
+        client, key = self._client(), self._key(name)
+        score = client.zscore(key, member)
+        if score is None:
+            return None
+        return client.zcount(key, f"({score}", "+inf") + 1, int(score)
+
+    def size(self, name):
+        return self._client().zcard(self._key(name))
+
+
+class MemoryLeaderboards:
+    """
+    Лидерборды в памяти процесса для кэша без Redis (разработка, тесты).
+    Для каждого лидерборда хранятся оценки участников и список
+    (-оценка, участник), отсортированный по убыванию оценки.
+    """
+
+    def __init__(self):
+        self._boards = defaultdict(lambda: ({}, []))
+        self._lock = threading.Lock()
+
+    def _board(self, name):
+        return self._boards.get(name, ({}, []))
+
+    def _set(self, name, member, score):
+        scores, ordered = self._boards[name]
+        previous = scores.get(member)
+        if previous is not None:
+            ordered.pop(bisect_left(ordered, (-previous, member)))
+        scores[member] = score
+        insort(ordered, (-score, member))
+
+    def apply(self, best=(), increments=(), removals=()):
+        with self._lock:
+            for name, member, score in best:
+                if score > self._boards[name][0].get(member, -1):
+                    self._set(name, member, score)
+            for name, member, delta in increments:
+                self._set(
+                    name, member, self._boards[name][0].get(member, 0) + delta
+                )
+            for name, member in removals:
+                scores, ordered = self._boards[name]
+                if member in scores:
+                    score = scores.pop(member)
+                    ordered.pop(bisect_left(ordered, (-score, member)))
+
+    def replace(self, name, scores):
+        with self._lock:
+            self._boards[name] = (
+                dict(scores),
+                sorted((-score, member) for member, score in scores.items()),
+            )
+
+    def top(self, name, limit):
+        with self._lock:
+            return [
+                (member, -score)
+                for score, member in self._board(name)[1][:limit]
+            ]
+
+    def rank(self, name, member):
+        with self._lock:
+            scores, ordered = self._board(name)
+            score = scores.get(member)
+            if score is None:
+                return None
+            return bisect_left(ordered, (-score,)) + 1, score
+
+    def size(self, name):
+        with self._lock:
+            return len(self._board(name)[0])
+
+
+_memory_leaderboards = MemoryLeaderboards()
+
+
+def get_leaderboards():
+    """
+    Хранилище лидербордов: Redis, если он настроен как кэш по умолчанию,
+    иначе - память процесса
+    """
+    backend = caches["default"]
+    if isinstance(backend, RedisCache):
+        return RedisLeaderboards(backend)
+    return _memory_leaderboards
+
+
+def _apply_safely(**changes):
+    """
+    Лидерборды вторичны по отношению к базе данных: ошибка Redis
+    не должна ломать сдачу теста, расхождение исправит
+    rebuild_leaderboards
+    """
+    try:
+        get_leaderboards().apply(**changes)
+    except Exception:
+        logger.exception("Не удалось обновить лидерборды")
+
+
+def record_best_scores(entries):
+    """
+    Обновляет лидерборды после коммита текущей транзакции.
+    entries - (course_id, test_id, user_id, лучшая оценка, прирост
+    лучшей оценки).
+    """
+    best, increments = [], []
+    for course_id, test_id, user_id, best_score, delta in entries:
+        best.append((test_board(test_id), user_id, best_score))
+        increments.append((course_board(course_id), user_id, delta))
+    if best:
+        transaction.on_commit(
+            lambda: _apply_safely(best=best, increments=increments)
+        )
+
+
+def remove_results(entries, departed=()):
+    """
+    Убирает удаленные результаты из лидербордов после коммита.
+    entries - (course_id, test_id, user_id, лучшая оценка),
+    departed - (course_id, user_id) участников, у которых не осталось
+    результатов в курсе: они убираются и из лидерборда курса.
+    """
+    increments, removals = [], []
+    for course_id, test_id, user_id, best_score in entries:
+        increments.append((course_board(course_id), user_id, -best_score))
+        removals.append((test_board(test_id), user_id))
+    for course_id, user_id in departed:
+        removals.append((course_board(course_id), user_id))
+    if removals:
+        transaction.on_commit(
+            lambda: _apply_safely(increments=increments, removals=removals)
+        )
+
+
+def rebuild_course(course_id):
+    """
+    Пересобирает из базы данных лидерборды курса и всех его тестов
+    одним запросом к результатам
+    """
+    test_ids = list(
+        Test.objects.filter(course_id=course_id).values_list("pk", flat=True)
+    )
+    tests = {test_id: {} for test_id in test_ids}
+    totals = defaultdict(int)
+    results = TestResult.objects.filter(test_id__in=test_ids).values_list(
+        "test_id", "user_id", Coalesce("best_score", "score")
+    )
+    for test_id, user_id, best_score in results.iterator(
+        chunk_size=settings.STREAM_CHUNK_SIZE * 10
+    ):
+        tests[test_id][user_id] = best_score
+        totals[user_id] += best_score
+    leaderboards = get_leaderboards()
+    for test_id, scores in tests.items():
+        leaderboards.replace(test_board(test_id), scores)
+    leaderboards.replace(course_board(course_id), totals)
+    return len(totals)
+
+
+def drop_tests(test_ids, course_ids):
+    """
+    Убирает лидерборды удаленных тестов и пересобирает лидерборды
+    их курсов. Лидерборд удаленного курса при этом удаляется.
+    """
+    try:
+        leaderboards = get_leaderboards()
+        for test_id in test_ids:
+            leaderboards.replace(test_board(test_id), {})
+        for course_id in course_ids:
+            rebuild_course(course_id)
+    except Exception:
+        logger.exception("Не удалось обновить лидерборды")
+
+
+def board_payload(name, user_id, limit):
+    """
+    Первые limit участников лидерборда и место пользователя user_id.
+    Имена пользователей берутся из кэша пользователей.
+    """
+    leaderboards = get_leaderboards()
+    top = leaderboards.top(name, limit)
+    users = get_cached_users([member for member, _ in top])
+    entries, rank, previous = [], 0, None
+    for position, (member, score) in enumerate(top, start=1):
+        if score != previous:
+            rank, previous = position, score
+        user = users.get(member)
+        entries.append(
+            {
+                "rank": rank,
+                "user": member,
+                "username": user.username if user else None,
+                "score": score,
+            }
+        )
+    me = leaderboards.rank(name, user_id)
+    return {
+        "size": leaderboards.size(name),
+        "top": entries,
+        "me": {"rank": me[0], "score": me[1]} if me else None,
+    }
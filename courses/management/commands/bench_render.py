@@ -0,0 +1,91 @@
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from config.renderers import MessagePackRenderer, ORJSONRenderer
+from courses.models import Course, Material
+from courses.serializers import CourseSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Замер времени рендеринга большого курса разными рендерерами"""
+
+    help = (
+        "Создает во временной транзакции курс с большим числом материалов"
+        " и студентов и сравнивает время рендеринга CourseSerializer"
+        " стандартным JSONRenderer, orjson и MessagePack"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--materials", type=int, default=500)
+        parser.add_argument("--students", type=int, default=500)
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Число повторов замера"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            data = self.build_course(options["materials"], options["students"])
+            transaction.set_rollback(True)
+
+        renderers = [
+            JSONRenderer(),
+            ORJSONRenderer(),
+            MessagePackRenderer(),
+        ]
+        baseline = None
+        for renderer in renderers:
+            size = len(renderer.render(data))
+            seconds = min(
+                timeit.repeat(
+                    lambda: renderer.render(data),
+                    number=1,
+                    repeat=options["repeat"],
+                )
+            )
+            baseline = baseline or seconds
+            self.stdout.write(
+                f"{type(renderer).__name__:<22} {seconds * 1000:8.2f} мс"
+                f"  {size / 1024:8.1f} КБ  x{baseline / seconds:.1f}"
+            )
+
+    def build_course(self, materials, students):
+        owner = User.objects.create_user(
+            email="bench-owner@example.com",
+            username="bench-owner",
+            password=None,
+            role="teacher",
+        )
+        course = Course.objects.create(
+            title="Bench", description="Курс для замера", owner=owner
+        )
+        Material.objects.bulk_create(
+            Material(
+                course=course,
+                title=f"Материал {number}",
+                content="Текст материала " * 50,
+                order=number,
+            )
+            for number in range(materials)
+        )
+        users = User.objects.bulk_create(
+            User(
+                email=f"bench-student{number}@example.com",
+                username=f"bench-student{number}",
+                phone_number=f"+7900{number:07d}",
+                role="student",
+            )
+            for number in range(students)
+        )
+        course.students.add(*users)
+        course = (
+            Course.objects.select_related("owner")
+            .prefetch_related("materials", "students")
+            .get(pk=course.pk)
+        )
+        return CourseSerializer(course).data
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.cohort import grade_cohort
+from courses.grading import get_answer_key
+
+
+class Command(BaseCommand):
+    """Массовая проверка ответов группы студентов из CSV"""
+
+    help = (
+        "Проверяет ответы группы по тесту из CSV: первая строка - email и"
+        " id вопросов, далее строки студентов с id выбранных ответов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("test_id", type=int, help="id теста")
+        parser.add_argument("path", help="Путь к CSV файлу с ответами")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество студентов, сохраняемых за одну транзакцию",
+        )
+
+    def handle(self, *args, **options):
+        answer_key = get_answer_key(options["test_id"])
+        if answer_key is None:
+            raise CommandError(f"Тест {options['test_id']} не найден")
+
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as file:
+                report = grade_cohort(
+                    answer_key, file, batch_size=options["batch_size"]
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for email in report.unknown_users:
+            self.stderr.write(f"Студент курса не найден: {email}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Проверено {report.graded} из {report.students} студентов,"
+                f" сдали {report.passed}. Проверка заняла"
+                f" {report.grading_seconds:.3f} с, всего"
+                f" {report.total_seconds:.3f} с"
+                f" ({report.throughput:.1f} студентов/с)"
+            )
+        )
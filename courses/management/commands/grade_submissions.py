@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.grading import grade_pending_submissions
+
+
+class Command(BaseCommand):
+    """Обработчик очереди отправок, ожидающих проверки"""
+
+    help = "Проверяет отложенные отправки ответов пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.GRADING_BATCH_SIZE,
+            help="Количество отправок в одной пачке",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, когда очередь пуста",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Обработать очередь и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = grade_pending_submissions(options["batch_size"])
+            total += processed
+            if processed:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Проверено отправок: {total}"))
@@ -0,0 +1,62 @@
+import orjson
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.analysis import analyse_test, get_item_analysis
+from courses.models import Test
+
+
+class Command(BaseCommand):
+    """Анализ вопросов теста по результатам студентов"""
+
+    help = (
+        "Выводит для каждого вопроса теста долю правильных ответов,"
+        " различающую способность и доли выбора вариантов ответа"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("test_id", type=int, help="id теста")
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Вывести полный отчет в JSON",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Рассчитать заново, не используя кэш",
+        )
+
+    def handle(self, *args, **options):
+        test_id = options["test_id"]
+        if not Test.objects.filter(pk=test_id).exists():
+            raise CommandError(f"Тест {test_id} не найден")
+        analysis = (
+            analyse_test(test_id)
+            if options["no_cache"]
+            else get_item_analysis(test_id)
+        )
+        if options["json"]:
+            self.stdout.write(
+                orjson.dumps(analysis, option=orjson.OPT_INDENT_2).decode()
+            )
+            return
+
+        self.stdout.write(
+            f"Тест {test_id}: результатов {analysis['results']},"
+            f" ответов {analysis['responses']}"
+        )
+        for question in analysis["questions"]:
+            rates = ", ".join(
+                f"{answer['id']}{'*' if answer['is_correct'] else ''}:"
+                f" {answer['rate']}"
+                for answer in question["answers"]
+            )
+            line = (
+                f"Вопрос {question['id']}: p={question['p_value']}"
+                f" r={question['discrimination']}"
+                f" пропуски={question['omitted']} [{rates}]"
+            )
+            if question["flags"]:
+                line += " " + ", ".join(question["flags"])
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
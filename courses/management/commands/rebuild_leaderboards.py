@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from courses.leaderboard import rebuild_course
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    """Пересборка лидербордов курсов и тестов из базы данных"""
+
+    help = (
+        "Пересобирает лидерборды тестов (лучшая оценка) и курсов"
+        " (сумма лучших оценок) по таблице результатов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course",
+            type=int,
+            action="append",
+            dest="course_ids",
+            help="id курса, можно указать несколько раз. По умолчанию - все",
+        )
+
+    def handle(self, *args, **options):
+        course_ids = options["course_ids"] or list(
+            Course.objects.order_by("pk").values_list("pk", flat=True)
+        )
+        for course_id in course_ids:
+            students = rebuild_course(course_id)
+            self.stdout.write(f"Курс {course_id}: участников {students}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересобрано курсов: {len(course_ids)}")
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from courses.statistics import rebuild_statistics
+
+
+class Command(BaseCommand):
+    """Сверка статистики тестов с таблицей результатов"""
+
+    help = (
+        "Пересобирает статистику тестов (число результатов, доля сдавших,"
+        " среднее, дисперсия, распределение оценок для процентилей)"
+        " по таблице результатов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--test",
+            type=int,
+            action="append",
+            dest="test_ids",
+            help="id теста, можно указать несколько раз. По умолчанию - все",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество тестов в одной транзакции",
+        )
+
+    def handle(self, *args, **options):
+        checked, fixed = rebuild_statistics(
+            options["test_ids"], batch_size=options["batch_size"]
+        )
+        style = self.style.WARNING if fixed else self.style.SUCCESS
+        self.stdout.write(
+            style(f"Проверено тестов: {checked}, исправлено: {fixed}")
+        )
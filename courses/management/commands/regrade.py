@@ -0,0 +1,63 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.regrade import pending_regrades, regrade_test
+
+
+class Command(BaseCommand):
+    """Пересчет результатов тестов после изменения ключа ответов"""
+
+    help = (
+        "Пересчитывает оценки по сохраненным ответам для тестов, у которых"
+        " изменились правильные ответы, вопросы или проходной балл"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--test",
+            type=int,
+            action="append",
+            dest="test_ids",
+            help="id теста, можно указать несколько раз."
+            " По умолчанию - все тесты, ожидающие пересчета",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.REGRADE_CHUNK_SIZE,
+            help="Количество результатов в одной транзакции",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(os.cpu_count() or 1, 4),
+            help="Количество процессов для больших тестов",
+        )
+
+    def handle(self, *args, **options):
+        test_ids = options["test_ids"] or pending_regrades()
+        if not test_ids:
+            self.stdout.write("Нет тестов, ожидающих пересчета")
+            return
+
+        for test_id in test_ids:
+
+            def progress(done, total, updated):
+                self.stdout.write(
+                    f"Тест {test_id}: {done}/{total} диапазонов,"
+                    f" обновлено {updated}"
+                )
+
+            updated = regrade_test(
+                test_id,
+                chunk_size=options["chunk_size"],
+                workers=options["workers"],
+                progress=progress,
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Тест {test_id}: пересчитано результатов {updated}"
+                )
+            )
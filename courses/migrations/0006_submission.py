@@ -0,0 +1,157 @@
+# Generated by Django 5.2 on 2026-10-16 23:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0005_alter_test_description_alter_test_material"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Submission",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "user_answers",
+                    models.JSONField(
+                        default=list,
+                        help_text="Ответы в исходном виде",
+                        verbose_name="Ответы",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает проверки"),
+                            ("done", "Проверено"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        help_text="Статус проверки",
+                        max_length=16,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "score",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Оценка",
+                        null=True,
+                        verbose_name="Оценка",
+                    ),
+                ),
+                (
+                    "is_passed",
+                    models.BooleanField(
+                        blank=True,
+                        help_text="Статус прохождения",
+                        null=True,
+                        verbose_name="Статус прохождения",
+                    ),
+                ),
+                (
+                    "correct_answers",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Правильных ответов",
+                        null=True,
+                        verbose_name="Правильных ответов",
+                    ),
+                ),
+                (
+                    "total_questions",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Всего вопросов",
+                        null=True,
+                        verbose_name="Всего вопросов",
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True,
+                        help_text="Ошибка проверки",
+                        null=True,
+                        verbose_name="Ошибка",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="Дата отправки",
+                        verbose_name="Дата отправки",
+                    ),
+                ),
+                (
+                    "processed_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Дата проверки",
+                        null=True,
+                        verbose_name="Дата проверки",
+                    ),
+                ),
+                (
+                    "test",
+                    models.ForeignKey(
+                        help_text="Тест",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="submissions",
+                        to="courses.test",
+                        verbose_name="Тест",
+                    ),
+                ),
+                (
+                    "test_result",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Результат теста",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="submissions",
+                        to="courses.testresult",
+                        verbose_name="Результат теста",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="Студент",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="submissions",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Студент",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Отправка ответов",
+                "verbose_name_plural": "Отправки ответов",
+                "ordering": ["created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "id"],
+                        name="courses_sub_status_bb9413_idx",
+                    )
+                ],
+            },
+        ),
+    ]
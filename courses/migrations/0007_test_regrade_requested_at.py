@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-16 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0006_submission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="test",
+            name="regrade_requested_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Время изменения ключа ответов или проходного балла",
+                null=True,
+                verbose_name="Запрошен пересчет",
+            ),
+        ),
+    ]
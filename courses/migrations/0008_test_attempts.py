@@ -0,0 +1,182 @@
+# Generated by Django 5.2 on 2026-10-16 23:55
+
+import django.db.models.deletion
+from django.core.management.color import no_style
+from django.db import migrations, models
+from django.db.models import F
+
+
+def create_initial_attempts(apps, schema_editor):
+    """
+    Создает по одной попытке для каждого существующего результата
+    и привязывает к ней сохраненные ответы.
+    Попытка получает id своего результата, поэтому все шаги - линейные
+    INSERT ... SELECT и UPDATE без коррелированных подзапросов: индекс
+    по test_result создается только в конце миграции.
+    """
+    TestResult = apps.get_model("courses", "TestResult")
+    TestAttempt = apps.get_model("courses", "TestAttempt")
+    UserAnswer = apps.get_model("courses", "UserAnswer")
+
+    quote = schema_editor.quote_name
+    columns = ", ".join(
+        quote(column) for column in ("score", "is_passed", "completed_at")
+    )
+    schema_editor.execute(
+        f"INSERT INTO {quote(TestAttempt._meta.db_table)} "
+        f"({quote('id')}, {quote('test_result_id')}, {columns}) "
+        f"SELECT {quote('id')}, {quote('id')}, {columns} "
+        f"FROM {quote(TestResult._meta.db_table)}"
+    )
+    for sql in schema_editor.connection.ops.sequence_reset_sql(
+        no_style(), [TestAttempt]
+    ):
+        schema_editor.execute(sql)
+
+    TestResult.objects.update(
+        latest_attempt_id=F("pk"),
+        best_attempt_id=F("pk"),
+        best_score=F("score"),
+        attempts_count=1,
+    )
+    UserAnswer.objects.update(attempt_id=F("test_result_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0007_test_regrade_requested_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="testresult",
+            name="attempts_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Количество попыток",
+                verbose_name="Количество попыток",
+            ),
+        ),
+        migrations.AddField(
+            model_name="testresult",
+            name="best_score",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Лучшая оценка",
+                null=True,
+                verbose_name="Лучшая оценка",
+            ),
+        ),
+        migrations.CreateModel(
+            name="TestAttempt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "score",
+                    models.PositiveIntegerField(
+                        help_text="Оценка", verbose_name="Оценка"
+                    ),
+                ),
+                (
+                    "is_passed",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Статус прохождения",
+                        verbose_name="Статус прохождения",
+                    ),
+                ),
+                (
+                    "completed_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="Дата завершения",
+                        verbose_name="Дата завершения",
+                    ),
+                ),
+                (
+                    "test_result",
+                    models.ForeignKey(
+                        help_text="Результат теста",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attempts",
+                        to="courses.testresult",
+                        verbose_name="Результат теста",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Попытка прохождения теста",
+                "verbose_name_plural": "Попытки прохождения теста",
+                "ordering": ["completed_at"],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name="useranswer",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="testresult",
+            name="best_attempt",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Лучшая попытка",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="courses.testattempt",
+                verbose_name="Лучшая попытка",
+            ),
+        ),
+        migrations.AddField(
+            model_name="testresult",
+            name="latest_attempt",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Последняя попытка",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="courses.testattempt",
+                verbose_name="Последняя попытка",
+            ),
+        ),
+        migrations.AddField(
+            model_name="useranswer",
+            name="attempt",
+            field=models.ForeignKey(
+                help_text="Попытка",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="user_answers",
+                to="courses.testattempt",
+                verbose_name="Попытка",
+            ),
+        ),
+        migrations.RunPython(
+            create_initial_attempts, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name="useranswer",
+            name="attempt",
+            field=models.ForeignKey(
+                help_text="Попытка",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="user_answers",
+                to="courses.testattempt",
+                verbose_name="Попытка",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="useranswer",
+            unique_together={("attempt", "question")},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-16 23:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0008_test_attempts"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(
+                fields=["created_at", "id"],
+                name="courses_cou_created_7ad857_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="testresult",
+            index=models.Index(
+                fields=["completed_at", "id"],
+                name="courses_tes_complet_399b45_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_course(apps, schema_editor):
+    """
+    Заполняет course у тестов, вопросов и ответов по родителю,
+    по одному UPDATE с подзапросом по первичному ключу на таблицу
+    """
+    Material = apps.get_model("courses", "Material")
+    Test = apps.get_model("courses", "Test")
+    Question = apps.get_model("courses", "Question")
+    Answer = apps.get_model("courses", "Answer")
+
+    Test.objects.update(
+        course_id=Subquery(
+            Material.objects.filter(pk=OuterRef("material_id")).values(
+                "course_id"
+            )
+        )
+    )
+    Question.objects.update(
+        course_id=Subquery(
+            Test.objects.filter(pk=OuterRef("test_id")).values("course_id")
+        )
+    )
+    Answer.objects.update(
+        course_id=Subquery(
+            Question.objects.filter(pk=OuterRef("question_id")).values(
+                "course_id"
+            )
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0009_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="test",
+            name="course",
+            field=models.ForeignKey(
+                editable=False,
+                help_text="Курс, заполняется по родительскому объекту",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="course",
+            field=models.ForeignKey(
+                editable=False,
+                help_text="Курс, заполняется по родительскому объекту",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.AddField(
+            model_name="answer",
+            name="course",
+            field=models.ForeignKey(
+                editable=False,
+                help_text="Курс, заполняется по родительскому объекту",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.RunPython(fill_course, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="test",
+            name="course",
+            field=models.ForeignKey(
+                editable=False,
+                help_text="Курс, заполняется по родительскому объекту",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="course",
+            field=models.ForeignKey(
+                editable=False,
+                help_text="Курс, заполняется по родительскому объекту",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="answer",
+            name="course",
+            field=models.ForeignKey(
+                editable=False,
+                help_text="Курс, заполняется по родительскому объекту",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="courses.course",
+                verbose_name="Курс",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0010_test_question_answer_course"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS courses_course_students_user_idx"
+                " ON courses_course_students (user_id, course_id)"
+            ),
+            reverse_sql=(
+                "DROP INDEX IF EXISTS courses_course_students_user_idx"
+            ),
+        ),
+    ]
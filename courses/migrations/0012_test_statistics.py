@@ -0,0 +1,124 @@
+# Generated by Django 5.2 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import courses.models
+
+
+def fill_statistics(apps, schema_editor):
+    """Собирает статистику тестов по уже сохраненным результатам"""
+    Test = apps.get_model("courses", "Test")
+    TestResult = apps.get_model("courses", "TestResult")
+    TestStatistics = apps.get_model("courses", "TestStatistics")
+
+    statistics = {
+        test_id: TestStatistics(test_id=test_id)
+        for test_id in Test.objects.values_list("pk", flat=True)
+    }
+    results = TestResult.objects.values_list(
+        "test_id", "score", "is_passed", "attempts_count"
+    )
+    for test_id, score, is_passed, attempts in results.iterator(
+        chunk_size=5000
+    ):
+        row = statistics[test_id]
+        row.results_count += 1
+        row.attempts_count += attempts
+        row.passed_count += is_passed
+        row.score_sum += score
+        row.score_square_sum += score * score
+        row.histogram[courses.models.TestStatistics.bucket(score)] += 1
+    TestStatistics.objects.bulk_create(statistics.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0011_enrollment_user_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TestStatistics",
+            fields=[
+                (
+                    "test",
+                    models.OneToOneField(
+                        help_text="Тест",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="statistics",
+                        serialize=False,
+                        to="courses.test",
+                        verbose_name="Тест",
+                    ),
+                ),
+                (
+                    "results_count",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Количество результатов",
+                        verbose_name="Количество результатов",
+                    ),
+                ),
+                (
+                    "attempts_count",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Количество попыток",
+                        verbose_name="Количество попыток",
+                    ),
+                ),
+                (
+                    "passed_count",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Количество сдавших",
+                        verbose_name="Количество сдавших",
+                    ),
+                ),
+                (
+                    "score_sum",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Сумма оценок",
+                        verbose_name="Сумма оценок",
+                    ),
+                ),
+                (
+                    "score_square_sum",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Сумма квадратов оценок",
+                        verbose_name="Сумма квадратов оценок",
+                    ),
+                ),
+                (
+                    "histogram",
+                    models.JSONField(
+                        default=courses.models.empty_histogram,
+                        help_text=(
+                            "Количество результатов по интервалам оценок"
+                            " в 10 баллов, оценка 100 входит в последний"
+                            " интервал"
+                        ),
+                        verbose_name="Гистограмма оценок",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True,
+                        help_text="Дата обновления",
+                        verbose_name="Дата обновления",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика теста",
+                "verbose_name_plural": "Статистика тестов",
+            },
+        ),
+        migrations.RunPython(fill_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-17 11:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import courses.models
+
+
+def fill_score_counts(apps, schema_editor):
+    """Заполняет распределение оценок по уже сохраненным результатам"""
+    TestResult = apps.get_model("courses", "TestResult")
+    TestStatistics = apps.get_model("courses", "TestStatistics")
+
+    statistics = {row.test_id: row for row in TestStatistics.objects.all()}
+    counts = (
+        TestResult.objects.order_by()
+        .values("test_id", "score")
+        .annotate(total=Count("pk"))
+    )
+    for row in counts:
+        score = min(row["score"], courses.models.MAX_SCORE)
+        statistics[row["test_id"]].score_counts[score] += row["total"]
+    TestStatistics.objects.bulk_update(
+        statistics.values(), ["score_counts"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0012_test_statistics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="teststatistics",
+            name="score_counts",
+            field=models.JSONField(
+                default=courses.models.empty_score_counts,
+                help_text=(
+                    "Количество результатов с каждой оценкой от 0 до 100"
+                ),
+                verbose_name="Распределение оценок",
+            ),
+        ),
+        migrations.RunPython(fill_score_counts, migrations.RunPython.noop),
+    ]
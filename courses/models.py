@@ -48,6 +48,7 @@ class Course(models.Model):
         verbose_name = _("Курс")
         verbose_name_plural = _("Курсы")
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["created_at", "id"])]
 
     def __str__(self):
         return self.title
@@ -95,11 +96,29 @@ class Material(models.Model):
         return f"{self.course.title} - {self.title}"
 
 
-class Test(models.Model):
+class CourseFromParentMixin:
+    """
+    Заполняет поле course по родительскому объекту (course_parent)
+    при каждом сохранении, в том числе при переносе в другой родитель
+    """
+
+    course_parent = None
+
+    def save(self, *args, **kwargs):
+        self.course_id = getattr(self, self.course_parent).course_id
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.course_parent in update_fields:
+            kwargs["update_fields"] = {*update_fields, "course"}
+        super().save(*args, **kwargs)
+
+
+class Test(CourseFromParentMixin, models.Model):
     """
     Модель представления теста
     """
 
+    course_parent = "material"
+
     material = models.ForeignKey(
         Material,
         verbose_name=_("Материал"),
@@ -107,6 +126,14 @@ class Test(models.Model):
         related_name="tests",
         help_text="Материал",
     )
+    course = models.ForeignKey(
+        Course,
+        verbose_name=_("Курс"),
+        on_delete=models.CASCADE,
+        related_name="+",
+        editable=False,
+        help_text="Курс, заполняется по родительскому объекту",
+    )
     title = models.CharField(
         _("Название"),
         max_length=256,
@@ -118,6 +145,14 @@ class Test(models.Model):
     passing_score = models.PositiveIntegerField(
         _("Проходной балл"), default=70, help_text="Проходной балл"
     )
+    regrade_requested_at = models.DateTimeField(
+        _("Запрошен пересчет"),
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text="Время изменения ключа ответов или проходного балла",
+    )
 
     class Meta:
         verbose_name = _("Тест")
@@ -127,11 +162,13 @@ class Test(models.Model):
         return f"Test for {self.material.title}"
 
 
-class Question(models.Model):
+class Question(CourseFromParentMixin, models.Model):
     """
     Модель представления вопроса
     """
 
+    course_parent = "test"
+
     test = models.ForeignKey(
         Test,
         verbose_name=_("Тест"),
@@ -139,6 +176,14 @@ class Question(models.Model):
         related_name="questions",
         help_text="Тест",
     )
+    course = models.ForeignKey(
+        Course,
+        verbose_name=_("Курс"),
+        on_delete=models.CASCADE,
+        related_name="+",
+        editable=False,
+        help_text="Курс, заполняется по родительскому объекту",
+    )
     text = models.TextField(
         _("Описание"),
         help_text="Описание вопроса",
@@ -158,17 +203,27 @@ class Question(models.Model):
         return self.text[:50]
 
 
-class Answer(models.Model):
+class Answer(CourseFromParentMixin, models.Model):
     """
     Модель представления ответа
     """
 
+    course_parent = "question"
+
     question = models.ForeignKey(
         Question,
         verbose_name=_("Вопрос"),
         on_delete=models.CASCADE,
         related_name="answers",
     )
+    course = models.ForeignKey(
+        Course,
+        verbose_name=_("Курс"),
+        on_delete=models.CASCADE,
+        related_name="+",
+        editable=False,
+        help_text="Курс, заполняется по родительскому объекту",
+    )
     text = models.CharField(
         _("Описание ответа"), max_length=256, help_text="Описание ответа"
     )
@@ -210,16 +265,185 @@ class TestResult(models.Model):
         auto_now_add=True,
         help_text="Статус завершения",
     )
+    latest_attempt = models.ForeignKey(
+        "TestAttempt",
+        verbose_name=_("Последняя попытка"),
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        help_text="Последняя попытка",
+    )
+    best_attempt = models.ForeignKey(
+        "TestAttempt",
+        verbose_name=_("Лучшая попытка"),
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        help_text="Лучшая попытка",
+    )
+    best_score = models.PositiveIntegerField(
+        _("Лучшая оценка"), null=True, blank=True, help_text="Лучшая оценка"
+    )
+    attempts_count = models.PositiveIntegerField(
+        _("Количество попыток"), default=0, help_text="Количество попыток"
+    )
 
     class Meta:
         verbose_name = _("Результат теста")
         verbose_name_plural = _("Результаты теста")
         unique_together = ["user", "test"]
+        indexes = [models.Index(fields=["completed_at", "id"])]
 
     def __str__(self):
         return f"{self.user.username} - {self.test.title} ({self.score}%)"
 
 
+HISTOGRAM_BUCKETS = 10
+MAX_SCORE = 100
+
+
+def empty_histogram():
+    return [0] * HISTOGRAM_BUCKETS
+
+
+def empty_score_counts():
+    return [0] * (MAX_SCORE + 1)
+
+
+class TestStatistics(models.Model):
+    """
+    Сводная статистика текущих результатов теста.
+    Обновляется при сохранении и пересчете результатов, поэтому
+    читается по первичному ключу без агрегации по TestResult.
+    """
+
+    test = models.OneToOneField(
+        Test,
+        verbose_name=_("Тест"),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="statistics",
+        help_text="Тест",
+    )
+    results_count = models.PositiveIntegerField(
+        _("Количество результатов"),
+        default=0,
+        help_text="Количество результатов",
+    )
+    attempts_count = models.PositiveIntegerField(
+        _("Количество попыток"), default=0, help_text="Количество попыток"
+    )
+    passed_count = models.PositiveIntegerField(
+        _("Количество сдавших"), default=0, help_text="Количество сдавших"
+    )
+    score_sum = models.BigIntegerField(
+        _("Сумма оценок"), default=0, help_text="Сумма оценок"
+    )
+    score_square_sum = models.BigIntegerField(
+        _("Сумма квадратов оценок"),
+        default=0,
+        help_text="Сумма квадратов оценок",
+    )
+    histogram = models.JSONField(
+        _("Гистограмма оценок"),
+        default=empty_histogram,
+        help_text="Количество результатов по интервалам оценок в 10 баллов,"
+        " оценка 100 входит в последний интервал",
+    )
+    score_counts = models.JSONField(
+        _("Распределение оценок"),
+        default=empty_score_counts,
+        help_text="Количество результатов с каждой оценкой от 0 до 100",
+    )
+    updated_at = models.DateTimeField(
+        _("Дата обновления"), auto_now=True, help_text="Дата обновления"
+    )
+
+    class Meta:
+        verbose_name = _("Статистика теста")
+        verbose_name_plural = _("Статистика тестов")
+
+    def __str__(self):
+        return f"Statistics of test #{self.test_id}"
+
+    @staticmethod
+    def bucket(score):
+        """Номер интервала гистограммы для оценки"""
+        return min(score * HISTOGRAM_BUCKETS // 100, HISTOGRAM_BUCKETS - 1)
+
+    def percentile_rank(self, score):
+        """
+        Процентильный ранг оценки среди текущих результатов теста:
+        доля результатов ниже нее плюс половина равных ей, в процентах.
+        Оценки - целые от 0 до 100, поэтому распределение хранится
+        полностью и ранг точный, время расчета не зависит от числа
+        результатов.
+        """
+        if not self.results_count:
+            return None
+        score = min(score, MAX_SCORE)
+        below = sum(self.score_counts[:score])
+        return round(
+            100 * (below + self.score_counts[score] / 2) / self.results_count,
+            1,
+        )
+
+    @property
+    def pass_rate(self):
+        if not self.results_count:
+            return None
+        return self.passed_count / self.results_count
+
+    @property
+    def mean(self):
+        if not self.results_count:
+            return None
+        return self.score_sum / self.results_count
+
+    @property
+    def variance(self):
+        """Дисперсия оценок по всем текущим результатам"""
+        if not self.results_count:
+            return None
+        return max(
+            self.score_square_sum / self.results_count - self.mean**2, 0.0
+        )
+
+
+class TestAttempt(models.Model):
+    """
+    Модель представления попытки прохождения теста.
+    Попытки только добавляются, текущий результат хранится в TestResult.
+    """
+
+    test_result = models.ForeignKey(
+        TestResult,
+        verbose_name=_("Результат теста"),
+        on_delete=models.CASCADE,
+        related_name="attempts",
+        help_text="Результат теста",
+    )
+    score = models.PositiveIntegerField(_("Оценка"), help_text="Оценка")
+    is_passed = models.BooleanField(
+        _("Статус прохождения"), default=False, help_text="Статус прохождения"
+    )
+    completed_at = models.DateTimeField(
+        _("Дата завершения"),
+        auto_now_add=True,
+        help_text="Дата завершения",
+    )
+
+    class Meta:
+        verbose_name = _("Попытка прохождения теста")
+        verbose_name_plural = _("Попытки прохождения теста")
+        ordering = ["completed_at"]
+
+    def __str__(self):
+        return f"Attempt #{self.pk} ({self.score}%)"
+
+
 class UserAnswer(models.Model):
     """
     Модель представления ответов юзера
@@ -232,6 +456,13 @@ class UserAnswer(models.Model):
         related_name="user_answers",
         help_text="Результат тестирования",
     )
+    attempt = models.ForeignKey(
+        TestAttempt,
+        verbose_name=_("Попытка"),
+        on_delete=models.CASCADE,
+        related_name="user_answers",
+        help_text="Попытка",
+    )
     question = models.ForeignKey(
         Question,
         verbose_name=_("Вопрос"),
@@ -248,10 +479,94 @@ class UserAnswer(models.Model):
     class Meta:
         verbose_name = _("Ответ студента")
         verbose_name_plural = _("Ответы студентов")
-        unique_together = ["test_result", "question"]
+        unique_together = ["attempt", "question"]
 
     def __str__(self):
         return (
             f"{self.test_result.user.username}'s answer to"
             f" {self.question.text[:20]}"
         )
+
+
+class Submission(models.Model):
+    """
+    Модель представления отправки ответов, ожидающей проверки
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Ожидает проверки")
+        DONE = "done", _("Проверено")
+        FAILED = "failed", _("Ошибка")
+
+    user = models.ForeignKey(
+        get_user_model(),
+        verbose_name=_("Студент"),
+        on_delete=models.CASCADE,
+        related_name="submissions",
+        help_text="Студент",
+    )
+    test = models.ForeignKey(
+        Test,
+        verbose_name=_("Тест"),
+        on_delete=models.CASCADE,
+        related_name="submissions",
+        help_text="Тест",
+    )
+    user_answers = models.JSONField(
+        _("Ответы"), default=list, help_text="Ответы в исходном виде"
+    )
+    status = models.CharField(
+        _("Статус"),
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        help_text="Статус проверки",
+    )
+    test_result = models.ForeignKey(
+        TestResult,
+        verbose_name=_("Результат теста"),
+        on_delete=models.SET_NULL,
+        related_name="submissions",
+        null=True,
+        blank=True,
+        help_text="Результат теста",
+    )
+    score = models.PositiveIntegerField(
+        _("Оценка"), null=True, blank=True, help_text="Оценка"
+    )
+    is_passed = models.BooleanField(
+        _("Статус прохождения"),
+        null=True,
+        blank=True,
+        help_text="Статус прохождения",
+    )
+    correct_answers = models.PositiveIntegerField(
+        _("Правильных ответов"),
+        null=True,
+        blank=True,
+        help_text="Правильных ответов",
+    )
+    total_questions = models.PositiveIntegerField(
+        _("Всего вопросов"),
+        null=True,
+        blank=True,
+        help_text="Всего вопросов",
+    )
+    error = models.TextField(
+        _("Ошибка"), null=True, blank=True, help_text="Ошибка проверки"
+    )
+    created_at = models.DateTimeField(
+        _("Дата отправки"), auto_now_add=True, help_text="Дата отправки"
+    )
+    processed_at = models.DateTimeField(
+        _("Дата проверки"), null=True, blank=True, help_text="Дата проверки"
+    )
+
+    class Meta:
+        verbose_name = _("Отправка ответов")
+        verbose_name_plural = _("Отправки ответов")
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"Submission #{self.pk} ({self.status})"
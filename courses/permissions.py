@@ -1,6 +1,8 @@
 from loguru import logger
 from rest_framework import permissions, status
 
+from .access import course_id_of, get_course_access
+
 
 class IsAdmin(permissions.BasePermission):
     """Проверка на администратора"""
@@ -54,19 +56,19 @@ class CanAccessCourse(permissions.BasePermission):
     code = status.HTTP_403_FORBIDDEN
 
     def has_object_permission(self, request, view, obj):
-        course = getattr(obj, "course", obj)
+        course_id = course_id_of(obj)
         logger.debug(
-            f"Проверка доступа к курсу {course.id} для {request.user}"
+            f"Проверка доступа к курсу {course_id} для {request.user}"
         )
 
         if request.user.role == "admin":
             return True
 
         if request.user.role == "teacher":
-            return course.owner == request.user
+            return course_id in get_course_access(request).owned
 
         if request.user.role == "student":
-            return course.students.filter(id=request.user.id).exists()
+            return course_id in get_course_access(request).enrolled
 
         return False
 
@@ -86,7 +88,7 @@ class IsCourseOwner(permissions.BasePermission):
         if request.user.role == "teacher":
             if not course:
                 return
-            return course.owner == request.user
+            return course.pk in get_course_access(request).owned
 
 
 class CanCreateMaterial(permissions.BasePermission):
@@ -110,7 +112,7 @@ class CanManageMaterial(permissions.BasePermission):
             return True
 
         if request.user.role == "teacher":
-            return obj.course.owner == request.user
+            return course_id_of(obj) in get_course_access(request).owned
 
         return False
 
@@ -136,7 +138,7 @@ class CanManageTest(permissions.BasePermission):
             return True
 
         if request.user.role == "teacher":
-            return obj.material.course.owner == request.user
+            return course_id_of(obj) in get_course_access(request).owned
 
         return False
 
@@ -154,7 +156,7 @@ class CanTakeTest(permissions.BasePermission):
         if request.user.role != "student":
             return False
 
-        return obj.material.course.students.filter(id=request.user.id).exists()
+        return course_id_of(obj) in get_course_access(request).enrolled
 
 
 class CanManageQuestion(permissions.BasePermission):
@@ -168,7 +170,7 @@ class CanManageQuestion(permissions.BasePermission):
             return True
 
         if request.user.role == "teacher":
-            return obj.test.material.course.owner == request.user
+            return course_id_of(obj) in get_course_access(request).owned
 
         return False
 
@@ -184,7 +186,7 @@ class CanManageAnswer(permissions.BasePermission):
             return True
 
         if request.user.role == "teacher":
-            return obj.question.test.material.course.owner == request.user
+            return course_id_of(obj) in get_course_access(request).owned
 
         return False
 
@@ -200,9 +202,9 @@ class CanViewTestResults(permissions.BasePermission):
             return True
 
         if request.user.role == "teacher":
-            return obj.test.material.course.owner == request.user
+            return course_id_of(obj) in get_course_access(request).owned
 
         if request.user.role == "student":
-            return obj.user == request.user
+            return obj.user_id == request.user.pk
 
         return False
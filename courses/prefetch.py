@@ -0,0 +1,105 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def _relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.is_relation or field.related_model is None:
+        return None
+    return field
+
+
+def _field_path(field):
+    """
+    Атрибуты источника поля, которые нужно загрузить, и вложенный
+    сериализатор, если он есть
+    """
+    if isinstance(field, serializers.ListSerializer):
+        return field.source_attrs, field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field.source_attrs, field
+    if isinstance(field, serializers.ManyRelatedField):
+        return field.source_attrs, None
+    if (
+        isinstance(field, serializers.RelatedField)
+        and not field.use_pk_only_optimization()
+    ):
+        return field.source_attrs, None
+    return field.source_attrs[:-1], None
+
+
+def _plan_path(model, attrs, nested):
+    """
+    План загрузки цепочки связей attrs от модели model.
+    Возвращает (select_related, prefetch_related) относительно model.
+    """
+    if not attrs:
+        return plan(model, nested) if nested is not None else ([], [])
+
+    name = attrs[0]
+    relation = _relation(model, name)
+    if relation is None:
+        return [], []
+    related_model = relation.related_model
+    select, prefetch = _plan_path(related_model, attrs[1:], nested)
+
+    if relation.one_to_many or relation.many_to_many:
+        queryset = related_model._default_manager.all()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return [], [Prefetch(name, queryset=queryset)]
+
+    for lookup in prefetch:
+        lookup.add_prefix(name)
+    return [name] + [f"{name}__{lookup}" for lookup in select], prefetch
+
+
+def plan(model, serializer):
+    """
+    Строит план загрузки связей для дерева сериализатора.
+    Связи "к одному" попадают в select_related, связи "ко многим" -
+    в Prefetch с собственным планом для вложенного сериализатора.
+    Возвращает (select_related, prefetch_related).
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+        attrs, nested = _field_path(field)
+        field_select, field_prefetch = _plan_path(model, attrs, nested)
+        select += field_select
+        prefetch += field_prefetch
+    return select, prefetch
+
+
+def apply_plan(queryset, serializer):
+    """Применяет к queryset план загрузки связей сериализатора"""
+    select, prefetch = plan(queryset.model, serializer)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class PrefetchPlanMixin:
+    """
+    Миксин ViewSet: для list и retrieve загружает все связи, нужные
+    сериализатору, постоянным числом запросов
+    """
+
+    planned_actions = ("list", "retrieve")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.planned_actions:
+            queryset = apply_plan(queryset, self.get_serializer())
+        return queryset
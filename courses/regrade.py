@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.db import connections, transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, Floor
+from django.utils import timezone
+from loguru import logger
+
+from .access import test_course_id
+from .grading import results_changed
+from .leaderboard import rebuild_course
+from .models import Question, Test, TestAttempt, TestResult, UserAnswer
+from .statistics import rebuild_statistics
+
+
+def request_regrade(*test_ids):
+    """Помечает тесты, результаты которых нужно пересчитать"""
+    test_ids = [test_id for test_id in test_ids if test_id is not None]
+    if test_ids:
+        Test.objects.filter(pk__in=test_ids).update(
+            regrade_requested_at=timezone.now()
+        )
+
+
+def _score_expression(test_id, total_questions):
+    """
+    Оценка попытки по сохраненным ответам, как в TestViewSet.submit:
+    int(правильных / всего * 100) в арифметике с плавающей точкой
+    """
+    if not total_questions:
+        return Value(0)
+    correct_answers = Subquery(
+        UserAnswer.objects.filter(
+            attempt=OuterRef("pk"),
+            answer__is_correct=True,
+            question__test_id=test_id,
+        )
+        .order_by()
+        .values("attempt")
+        .annotate(count=Count("pk"))
+        .values("count"),
+        output_field=IntegerField(),
+    )
+    return Cast(
+        Floor(
+            Cast(Coalesce(correct_answers, 0), FloatField())
+            / Value(float(total_questions))
+            * Value(100.0)
+        ),
+        IntegerField(),
+    )
+
+
+def regrade_chunk(test_id, start_id, end_id):
+    """
+    Пересчитывает попытки результатов теста с id в диапазоне
+    [start_id, end_id) и обновляет в них указатели на последнюю и лучшую
+    попытку. Все UPDATE выполняются в отдельной короткой транзакции.
+    Возвращает число обновленных результатов.
+    """
+    passing_score = Test.objects.values_list("passing_score", flat=True).get(
+        pk=test_id
+    )
+    total_questions = Question.objects.filter(test_id=test_id).count()
+    results = TestResult.objects.filter(
+        test_id=test_id, pk__gte=start_id, pk__lt=end_id
+    )
+    attempts = TestAttempt.objects.filter(
+        test_result__test_id=test_id,
+        test_result_id__gte=start_id,
+        test_result_id__lt=end_id,
+    )
+    latest = TestAttempt.objects.filter(pk=OuterRef("latest_attempt"))
+    best = TestAttempt.objects.filter(test_result=OuterRef("pk")).order_by(
+        "-score", "pk"
+    )
+    with transaction.atomic():
+        attempts.update(score=_score_expression(test_id, total_questions))
+        attempts.update(
+            is_passed=ExpressionWrapper(
+                Q(score__gte=passing_score), output_field=BooleanField()
+            )
+        )
+        updated = results.update(
+            score=Coalesce(Subquery(latest.values("score")), F("score")),
+            is_passed=Coalesce(
+                Subquery(latest.values("is_passed")), F("is_passed")
+            ),
+            best_attempt=Subquery(best.values("pk")[:1]),
+            best_score=Subquery(best.values("score")[:1]),
+        )
+    return updated
+
+
+def _chunk_ranges(test_id, chunk_size):
+    results = TestResult.objects.filter(test_id=test_id).order_by("pk")
+    first = results.values_list("pk", flat=True).first()
+    last = results.values_list("pk", flat=True).last()
+    if first is None:
+        return []
+    return [
+        (start, min(start + chunk_size, last + 1))
+        for start in range(first, last + 1, chunk_size)
+    ]
+
+
+def _init_worker():
+    django.setup()
+
+
+def regrade_test(test_id, chunk_size=5000, workers=1, progress=None):
+    """
+    Пересчитывает оценки и статус прохождения всех попыток и результатов
+    теста по сохраненным ответам.
+    Результаты обрабатываются диапазонами id по chunk_size, каждый
+    в своей короткой транзакции, поэтому таблица целиком не блокируется.
+    При workers > 1 диапазоны распределяются по пулу процессов.
+    После пересчета статистика теста собирается заново под блокировкой
+    ее строки, чтобы диапазоны не ждали друг друга на этой блокировке,
+    а лидерборды курса теста - заново из базы данных.
+    progress(обработано_диапазонов, всего_диапазонов, обновлено_строк)
+    вызывается после каждого диапазона.
+    Возвращает число обновленных результатов.
+    """
+    started_at = timezone.now()
+    ranges = _chunk_ranges(test_id, chunk_size)
+    logger.info(
+        f"Пересчет результатов теста {test_id}: {len(ranges)} диапазонов"
+    )
+    updated = 0
+    if workers > 1 and len(ranges) > 1:
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker
+        ) as executor:
+            futures = [
+                executor.submit(regrade_chunk, test_id, start, end)
+                for start, end in ranges
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                updated += future.result()
+                if progress:
+                    progress(done, len(ranges), updated)
+    else:
+        for done, (start, end) in enumerate(ranges, start=1):
+            updated += regrade_chunk(test_id, start, end)
+            if progress:
+                progress(done, len(ranges), updated)
+
+    Test.objects.filter(
+        pk=test_id, regrade_requested_at__lte=started_at
+    ).update(regrade_requested_at=None)
+    rebuild_statistics([test_id])
+    course_id = test_course_id(test_id)
+    if course_id is not None:
+        rebuild_course(course_id)
+    results_changed(test_id)
+    logger.info(f"Пересчитано результатов теста {test_id}: {updated}")
+    return updated
+
+
+def pending_regrades():
+    """id тестов, ожидающих пересчета"""
+    return list(
+        Test.objects.filter(regrade_requested_at__isnull=False)
+        .order_by("regrade_requested_at")
+        .values_list("pk", flat=True)
+    )
@@ -2,17 +2,83 @@ from rest_framework import serializers
 
 from users.serializers import UserRegisterSerializer
 
+from .fragments import FragmentCacheMixin, FragmentListSerializer
 from .models import (
     Answer,
     Course,
     Material,
     Question,
+    Submission,
     Test,
     TestResult,
+    TestStatistics,
     UserAnswer,
 )
 
 
+def _split_param(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    Миксин сериализатора с параметрами запроса ?fields= и ?expand=.
+    fields - поля через запятую, поля вложенных связей через точку
+    (materials.title). expand - вложенные связи, которые нужно включить
+    (materials.test.questions).
+    Если передан хотя бы один параметр, вложенные связи выводятся только
+    по запросу и не загружаются из базы данных.
+    """
+
+    def _sparse_path(self):
+        path = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return tuple(reversed(path))
+
+    @staticmethod
+    def _level_names(paths, prefix):
+        depth = len(prefix)
+        return {
+            path[depth]
+            for path in paths
+            if len(path) > depth and path[:depth] == prefix
+        }
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method != "GET":
+            return fields
+        params = request.query_params
+        if "fields" not in params and "expand" not in params:
+            return fields
+
+        prefix = self._sparse_path()
+        requested = [
+            tuple(item.split("."))
+            for item in _split_param(params.get("fields", ""))
+        ]
+        expanded = [
+            tuple(item.split("."))
+            for item in _split_param(params.get("expand", ""))
+        ]
+        requested_names = self._level_names(requested, prefix)
+        expanded_names = self._level_names(expanded, prefix)
+
+        for name in list(fields):
+            field = fields[name]
+            if name in requested_names or name in expanded_names:
+                continue
+            is_relation = isinstance(field, serializers.BaseSerializer)
+            if is_relation or requested_names:
+                fields.pop(name)
+        return fields
+
+
 class AnswerSerializerCreate(serializers.ModelSerializer):
     """Сериализатор ответа создание"""
 
@@ -31,24 +97,34 @@ class AnswerSerializerPublish(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(
+    FragmentCacheMixin, SparseFieldsMixin, serializers.ModelSerializer
+):
     """Сериализатор вопроса"""
 
     answers = AnswerSerializerPublish(many=True, read_only=True)
 
+    fragment_namespace = "question"
+
     class Meta:
         model = Question
+        list_serializer_class = FragmentListSerializer
         fields = ("id", "test", "text", "order", "answers")
         read_only_fields = ("id",)
 
 
-class TestSerializer(serializers.ModelSerializer):
+class TestSerializer(
+    FragmentCacheMixin, SparseFieldsMixin, serializers.ModelSerializer
+):
     """Сериализатор тестирования"""
 
     questions = QuestionSerializer(many=True, read_only=True)
 
+    fragment_namespace = "test"
+
     class Meta:
         model = Test
+        list_serializer_class = FragmentListSerializer
         fields = (
             "id",
             "material",
@@ -60,13 +136,18 @@ class TestSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(
+    FragmentCacheMixin, SparseFieldsMixin, serializers.ModelSerializer
+):
     """Сериализатор материала"""
 
     test = TestSerializer(read_only=True)
 
+    fragment_namespace = "material"
+
     class Meta:
         model = Material
+        list_serializer_class = FragmentListSerializer
         fields = (
             "id",
             "course",
@@ -79,7 +160,7 @@ class MaterialSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "created_at")
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор курса"""
 
     owner = UserRegisterSerializer(read_only=True)
@@ -111,7 +192,10 @@ class UserAnswerSerializer(serializers.ModelSerializer):
 class TestResultSerializer(serializers.ModelSerializer):
     """Сериализатор результатов юзера"""
 
-    user_answers = UserAnswerSerializer(many=True)
+    user_answers = UserAnswerSerializer(
+        many=True, read_only=True, source="latest_attempt.user_answers"
+    )
+    percentile = serializers.SerializerMethodField()
 
     class Meta:
         model = TestResult
@@ -122,6 +206,9 @@ class TestResultSerializer(serializers.ModelSerializer):
             "score",
             "is_passed",
             "completed_at",
+            "best_score",
+            "attempts_count",
+            "percentile",
             "user_answers",
         )
         read_only_fields = (
@@ -130,4 +217,57 @@ class TestResultSerializer(serializers.ModelSerializer):
             "score",
             "completed_at",
             "is_passed",
+            "best_score",
+            "attempts_count",
+        )
+
+    def get_percentile(self, obj):
+        """Процентильный ранг оценки среди результатов теста"""
+        try:
+            statistics = obj.test.statistics
+        except TestStatistics.DoesNotExist:
+            return None
+        return statistics.percentile_rank(obj.score)
+
+
+class TestStatisticsSerializer(serializers.ModelSerializer):
+    """Сериализатор статистики теста"""
+
+    pass_rate = serializers.FloatField(read_only=True)
+    mean = serializers.FloatField(read_only=True)
+    variance = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = TestStatistics
+        fields = (
+            "test",
+            "results_count",
+            "attempts_count",
+            "passed_count",
+            "pass_rate",
+            "mean",
+            "variance",
+            "histogram",
+            "updated_at",
+        )
+        read_only_fields = fields
+
+
+class SubmissionSerializer(serializers.ModelSerializer):
+    """Сериализатор отправки ответов на проверку"""
+
+    class Meta:
+        model = Submission
+        fields = (
+            "id",
+            "test",
+            "status",
+            "score",
+            "is_passed",
+            "correct_answers",
+            "total_questions",
+            "error",
+            "created_at",
+            "processed_at",
         )
+        read_only_fields = fields
@@ -0,0 +1,438 @@
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .access import invalidate_course_access
+from .cache import bump_version
+from .grading import discard_results, invalidate_answer_key
+from .leaderboard import drop_tests
+from .models import Answer, Course, Material, Question, Test, TestResult
+from .regrade import regrade_test, request_regrade
+
+_commit_batches = threading.local()
+
+
+def _on_commit_batch(handler, items):
+    """
+    Копит items до коммита и вызывает handler(items) один раз на все
+    накопленное: первый сработавший после коммита вызов забирает
+    элементы, остальные ничего не делают. Вне транзакции handler
+    вызывается сразу. Вызовы откаченной транзакции Django отбрасывает,
+    а ее элементы достанутся следующему коммиту, поэтому handler должен
+    сверять их с базой данных.
+    """
+    items = {item for item in items if item is not None}
+    if not items:
+        return
+    _commit_batches.__dict__.setdefault(handler, set()).update(items)
+    transaction.on_commit(partial(_flush_batch, handler))
+
+
+def _flush_batch(handler):
+    items = _commit_batches.__dict__.pop(handler, None)
+    if items:
+        handler(items)
+
+
+def _drop_leaderboards(tests):
+    """Лидерборды удаленных тестов и пересборка лидербордов их курсов"""
+    test_ids = {test_id for test_id, _ in tests}
+    test_ids -= set(
+        Test.objects.filter(pk__in=test_ids).values_list("pk", flat=True)
+    )
+    drop_tests(test_ids, {course_id for _, course_id in tests})
+
+
+def _invalidate_tests(*test_ids):
+    """
+    Сбрасывает ключи ответов сразу и повторно после коммита,
+    чтобы ключ, собранный параллельно до коммита, не остался в кэше
+    """
+    test_ids = {test_id for test_id in test_ids if test_id is not None}
+    for test_id in test_ids:
+        invalidate_answer_key(test_id)
+
+    def invalidate():
+        for test_id in test_ids:
+            invalidate_answer_key(test_id)
+
+    transaction.on_commit(invalidate)
+
+
+def _schedule_regrade(*test_ids):
+    """
+    Помечает тесты для пересчета результатов.
+    Небольшие тесты пересчитываются сразу после коммита, остальные
+    обрабатывает команда regrade.
+    """
+    test_ids = {test_id for test_id in test_ids if test_id is not None}
+    if not test_ids:
+        return
+    request_regrade(*test_ids)
+    _on_commit_batch(_regrade_small_tests, test_ids)
+
+
+def _regrade_small_tests(test_ids):
+    """
+    Пересчет после коммита тестов, которые все еще помечены для него.
+    regrade_test снимает пометку, поэтому каждый тест пересчитывается
+    один раз, а пометки откаченной транзакции не сохраняются.
+    """
+    tests = (
+        Test.objects.filter(
+            pk__in=test_ids, regrade_requested_at__isnull=False
+        )
+        .annotate(results_count=Count("results"))
+        .filter(results_count__lte=settings.REGRADE_INLINE_LIMIT)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    for test_id in tests:
+        regrade_test(test_id)
+
+
+def _bump_fragments(
+    course_ids=(), material_ids=(), test_ids=(), question_ids=()
+):
+    """
+    Увеличивает версии объектов и всех их предков
+    (вопрос -> тест -> материал -> курс) сразу и повторно после коммита.
+    По версиям строятся ключи фрагментов и ETag.
+    """
+    course_ids = {pk for pk in course_ids if pk is not None}
+    question_ids = {pk for pk in question_ids if pk is not None}
+    test_ids = {pk for pk in test_ids if pk is not None}
+    material_ids = {pk for pk in material_ids if pk is not None}
+    if question_ids:
+        test_ids.update(
+            Question.objects.filter(pk__in=question_ids).values_list(
+                "test_id", flat=True
+            )
+        )
+    if test_ids:
+        material_ids.update(
+            Test.objects.filter(pk__in=test_ids).values_list(
+                "material_id", flat=True
+            )
+        )
+    if material_ids:
+        course_ids.update(
+            Material.objects.filter(pk__in=material_ids).values_list(
+                "course_id", flat=True
+            )
+        )
+    branch = (
+        ("question", question_ids),
+        ("test", test_ids),
+        ("material", material_ids),
+        ("course", course_ids),
+    )
+
+    def bump():
+        for namespace, ids in branch:
+            for pk in ids:
+                bump_version(namespace, pk)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def _invalidate_access(user_ids):
+    """Сбрасывает кэш доступа к курсам сразу и повторно после коммита"""
+    user_ids = set(user_ids)
+    invalidate_course_access(*user_ids)
+    transaction.on_commit(lambda: invalidate_course_access(*user_ids))
+
+
+DESCENDANTS = {
+    Material: (
+        (Test, "material"),
+        (Question, "test__material"),
+        (Answer, "question__test__material"),
+    ),
+    Test: ((Question, "test"), (Answer, "question__test")),
+    Question: ((Answer, "question"),),
+}
+
+
+def _move_descendants(instance):
+    """
+    После переноса объекта в другой курс обновляет поле course
+    у всех его потомков, по одному UPDATE на таблицу
+    """
+    previous_course_id = getattr(instance, "_previous_course_id", None)
+    if previous_course_id in (None, instance.course_id):
+        return
+    for model, lookup in DESCENDANTS[type(instance)]:
+        model.objects.filter(**{lookup: instance}).update(
+            course_id=instance.course_id
+        )
+
+
+def _move_leaderboards(instance, test_ids):
+    """
+    После переноса тестов в другой курс пересобирает лидерборды
+    прежнего и нового курса: суммы по курсу зависят от его тестов
+    """
+    previous_course_id = getattr(instance, "_previous_course_id", None)
+    if previous_course_id in (None, instance.course_id):
+        return
+    _on_commit_batch(
+        _drop_leaderboards,
+        [
+            (test_id, course_id)
+            for test_id in test_ids
+            for course_id in (previous_course_id, instance.course_id)
+        ],
+    )
+
+
+def _answer_test_id(question_id):
+    return (
+        Question.objects.filter(pk=question_id)
+        .values_list("test_id", flat=True)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Test)
+def remember_test_state(sender, instance, **kwargs):
+    """Запоминает прежние проходной балл, материал и курс"""
+    (
+        instance._previous_passing_score,
+        instance._previous_material_id,
+        instance._previous_course_id,
+    ) = (
+        Test.objects.filter(pk=instance.pk)
+        .values_list("passing_score", "material_id", "course_id")
+        .first()
+        if instance.pk
+        else None
+    ) or (
+        None,
+        None,
+        None,
+    )
+
+
+@receiver(pre_save, sender=Question)
+def remember_question_test(sender, instance, **kwargs):
+    """Запоминает прежние тест и курс вопроса на случай его переноса"""
+    instance._previous_test_id, instance._previous_course_id = (
+        Question.objects.filter(pk=instance.pk)
+        .values_list("test_id", "course_id")
+        .first()
+        if instance.pk
+        else None
+    ) or (None, None)
+
+
+@receiver(pre_save, sender=Answer)
+def remember_answer_state(sender, instance, **kwargs):
+    """Запоминает прежний вопрос и правильность ответа"""
+    instance._previous_question_id, instance._previous_is_correct = (
+        Answer.objects.filter(pk=instance.pk)
+        .values_list("question_id", "is_correct")
+        .first()
+        if instance.pk
+        else None
+    ) or (None, None)
+
+
+@receiver(post_save, sender=Test)
+def test_saved(sender, instance, created, **kwargs):
+    _move_descendants(instance)
+    _move_leaderboards(instance, [instance.pk])
+    _invalidate_tests(instance.pk)
+    _bump_fragments(
+        material_ids=[
+            instance.material_id,
+            getattr(instance, "_previous_material_id", None),
+        ],
+        test_ids=[instance.pk],
+    )
+    previous = getattr(instance, "_previous_passing_score", None)
+    if previous is not None and previous != instance.passing_score:
+        _schedule_regrade(instance.pk)
+
+
+@receiver(post_delete, sender=Test)
+def test_deleted(sender, instance, **kwargs):
+    _invalidate_tests(instance.pk)
+    _bump_fragments(
+        material_ids=[instance.material_id], test_ids=[instance.pk]
+    )
+    _on_commit_batch(_drop_leaderboards, [(instance.pk, instance.course_id)])
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    previous_test_id = getattr(instance, "_previous_test_id", None)
+    _move_descendants(instance)
+    _invalidate_tests(instance.test_id, previous_test_id)
+    _bump_fragments(
+        test_ids=[instance.test_id, previous_test_id],
+        question_ids=[instance.pk],
+    )
+    if created or previous_test_id != instance.test_id:
+        _schedule_regrade(instance.test_id, previous_test_id)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    _invalidate_tests(instance.test_id)
+    _bump_fragments(test_ids=[instance.test_id], question_ids=[instance.pk])
+    _schedule_regrade(instance.test_id)
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, created, **kwargs):
+    previous_question_id = getattr(instance, "_previous_question_id", None)
+    test_ids = [_answer_test_id(instance.question_id)]
+    if previous_question_id not in (None, instance.question_id):
+        test_ids.append(_answer_test_id(previous_question_id))
+    _invalidate_tests(*test_ids)
+    _bump_fragments(question_ids=[instance.question_id, previous_question_id])
+    if not created and (
+        previous_question_id != instance.question_id
+        or getattr(instance, "_previous_is_correct", None)
+        != instance.is_correct
+    ):
+        _schedule_regrade(*test_ids)
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    test_id = _answer_test_id(instance.question_id)
+    _invalidate_tests(test_id)
+    _bump_fragments(test_ids=[test_id], question_ids=[instance.question_id])
+    _schedule_regrade(test_id)
+
+
+@receiver(pre_save, sender=Material)
+def remember_material_course(sender, instance, **kwargs):
+    """Запоминает прежний курс материала на случай его переноса"""
+    instance._previous_course_id = (
+        Material.objects.filter(pk=instance.pk)
+        .values_list("course_id", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Material)
+def material_saved(sender, instance, created, **kwargs):
+    _move_descendants(instance)
+    _move_leaderboards(instance, instance.tests.values_list("pk", flat=True))
+    _bump_fragments(
+        course_ids=[
+            instance.course_id,
+            getattr(instance, "_previous_course_id", None),
+        ],
+        material_ids=[instance.pk],
+    )
+
+
+@receiver(post_delete, sender=Material)
+def material_deleted(sender, instance, **kwargs):
+    _bump_fragments(
+        course_ids=[instance.course_id], material_ids=[instance.pk]
+    )
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_owner(sender, instance, **kwargs):
+    """Запоминает прежнего владельца курса"""
+    instance._previous_owner_id = (
+        Course.objects.filter(pk=instance.pk)
+        .values_list("owner_id", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    _bump_fragments(course_ids=[instance.pk])
+    previous_owner_id = getattr(instance, "_previous_owner_id", None)
+    if created or previous_owner_id != instance.owner_id:
+        _invalidate_access([instance.owner_id, previous_owner_id])
+
+
+@receiver(pre_delete, sender=Course)
+def course_deleting(sender, instance, **kwargs):
+    _invalidate_access(
+        [
+            instance.owner_id,
+            *instance.students.values_list("pk", flat=True),
+        ]
+    )
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    _bump_fragments(course_ids=[instance.pk])
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def course_students_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        course_ids = [instance.pk]
+        user_ids = (
+            pk_set
+            if pk_set
+            else instance.students.values_list("pk", flat=True)
+        )
+    else:
+        user_ids = [instance.pk]
+        course_ids = (
+            pk_set
+            if pk_set
+            else Course.objects.filter(students=instance).values_list(
+                "pk", flat=True
+            )
+        )
+    _bump_fragments(course_ids=course_ids)
+    _invalidate_access(user_ids)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def user_deleting(sender, instance, **kwargs):
+    """
+    Результаты пользователя удаляются каскадом без сигналов,
+    поэтому они вычитаются из статистики и лидербордов заранее
+    """
+    discard_results(TestResult.objects.filter(user_id=instance.pk))
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    """Данные пользователя выводятся в курсах, где он владелец или студент"""
+    if created:
+        _invalidate_access([instance.pk])
+        return
+    if update_fields and set(update_fields) <= {"last_login", "password"}:
+        return
+    _bump_fragments(
+        course_ids=Course.objects.filter(
+            Q(owner=instance) | Q(students=instance)
+        ).values_list("pk", flat=True)
+    )
@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models import (
+    BigIntegerField,
+    Count,
+    ExpressionWrapper,
+    F,
+    Q,
+    Sum,
+)
+from django.utils import timezone
+from loguru import logger
+
+from .models import MAX_SCORE, Test, TestResult, TestStatistics
+
+STATISTICS_FIELDS = (
+    "results_count",
+    "attempts_count",
+    "passed_count",
+    "score_sum",
+    "score_square_sum",
+    "histogram",
+    "score_counts",
+)
+
+
+def lock_statistics(test_ids):
+    """
+    Строки статистики тестов, заблокированные до конца транзакции.
+    Недостающие строки создаются, блокировки берутся в порядке test_id,
+    чтобы параллельные сдачи нескольких тестов не приводили к deadlock.
+    Возвращает {test_id: TestStatistics}.
+    """
+    test_ids = sorted(set(test_ids))
+    TestStatistics.objects.bulk_create(
+        [TestStatistics(test_id=test_id) for test_id in test_ids],
+        ignore_conflicts=True,
+    )
+    return {
+        statistics.test_id: statistics
+        for statistics in TestStatistics.objects.select_for_update()
+        .filter(test_id__in=test_ids)
+        .order_by("test_id")
+    }
+
+
+def record_result(statistics, previous=None, current=None, attempts=0):
+    """
+    Заменяет в статистике результат previous на current.
+    Результаты задаются парой (оценка, сдан), None - результата нет
+    (новый результат или удаление).
+    """
+    for result, sign in ((previous, -1), (current, 1)):
+        if result is None:
+            continue
+        score, is_passed = result
+        statistics.results_count += sign
+        statistics.passed_count += sign * bool(is_passed)
+        statistics.score_sum += sign * score
+        statistics.score_square_sum += sign * score * score
+        statistics.histogram[TestStatistics.bucket(score)] += sign
+        statistics.score_counts[min(score, MAX_SCORE)] += sign
+    statistics.attempts_count += attempts
+
+
+def save_statistics(statistics):
+    """Сохраняет измененные строки статистики одним запросом"""
+    statistics = list(statistics)
+    now = timezone.now()
+    for row in statistics:
+        row.updated_at = now
+    TestStatistics.objects.bulk_update(
+        statistics, [*STATISTICS_FIELDS, "updated_at"]
+    )
+
+
+def summarize(results):
+    """
+    Статистика набора результатов, посчитанная двумя агрегирующими
+    запросами: итоги по тесту и число результатов с каждой оценкой.
+    Возвращает {test_id: TestStatistics} без сохранения.
+    """
+    results = results.order_by()
+    summary = {}
+    for row in results.values("test_id").annotate(
+        total=Count("pk"),
+        attempts=Sum("attempts_count"),
+        passed=Count("pk", filter=Q(is_passed=True)),
+        scores=Sum("score"),
+        squares=Sum(
+            ExpressionWrapper(
+                F("score") * F("score"), output_field=BigIntegerField()
+            )
+        ),
+    ):
+        summary[row["test_id"]] = TestStatistics(
+            test_id=row["test_id"],
+            results_count=row["total"],
+            attempts_count=row["attempts"] or 0,
+            passed_count=row["passed"],
+            score_sum=row["scores"] or 0,
+            score_square_sum=row["squares"] or 0,
+        )
+    for row in results.values("test_id", "score").annotate(total=Count("pk")):
+        statistics, score = summary[row["test_id"]], row["score"]
+        statistics.histogram[TestStatistics.bucket(score)] += row["total"]
+        statistics.score_counts[min(score, MAX_SCORE)] += row["total"]
+    return summary
+
+
+def rebuild_statistics(test_ids=None, batch_size=500):
+    """
+    Пересобирает статистику тестов по таблице TestResult.
+    Тесты обрабатываются пачками по batch_size, каждая в своей
+    транзакции. Возвращает (проверено тестов, исправлено строк).
+    """
+    tests = Test.objects.order_by("pk").values_list("pk", flat=True)
+    if test_ids:
+        tests = tests.filter(pk__in=test_ids)
+    tests = list(tests)
+    fixed = 0
+    for start in range(0, len(tests), batch_size):
+        batch = tests[start : start + batch_size]
+        with transaction.atomic():
+            current = lock_statistics(batch)
+            computed = summarize(TestResult.objects.filter(test_id__in=batch))
+            for test_id, statistics in current.items():
+                fresh = computed.get(test_id) or TestStatistics(
+                    test_id=test_id
+                )
+                values = [getattr(fresh, field) for field in STATISTICS_FIELDS]
+                if values != [
+                    getattr(statistics, field) for field in STATISTICS_FIELDS
+                ]:
+                    fixed += 1
+                for field, value in zip(STATISTICS_FIELDS, values):
+                    setattr(statistics, field, value)
+            save_statistics(current.values())
+    logger.info(
+        f"Статистика пересобрана: тестов {len(tests)}, исправлено {fixed}"
+    )
+    return len(tests), fixed
@@ -1,9 +1,34 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+import msgpack
+import orjson
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from phonenumber_field.phonenumber import PhoneNumber
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
-from .models import Answer, Course, Material, Question, Test
+from config.renderers import ORJSONRenderer
+
+from .access import load_course_access
+from .cache import get_version
+from .cohort import grade_cohort
+from .grading import (
+    delete_results,
+    get_answer_key,
+    grade_pending_submissions,
+    save_result,
+)
+from .leaderboard import course_board, get_leaderboards, rebuild_course
+from .models import Answer, Course, Material, Question, Test, TestResult
+from .regrade import regrade_test
+from .statistics import rebuild_statistics
 
 User = get_user_model()
 
@@ -107,6 +132,27 @@ class CourseAPITestCase(APITestCase):
         response = self.client.post(reverse("courses:course-list"), data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_course_list_cursor_pagination(self):
+        """Тест курсорной пагинации списка курсов"""
+        for number in range(4):
+            Course.objects.create(title=f"Course {number}", owner=self.teacher)
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:course-list")
+
+        titles = []
+        params = {"page_size": 2, "fields": "id,title"}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertFalse(
+                any("COUNT(" in query["sql"] for query in queries)
+            )
+            self.assertLessEqual(len(response.data["results"]), 2)
+            titles += [course["title"] for course in response.data["results"]]
+            url, params = response.data["next"], None
+        self.assertEqual(len(titles), 5)
+        self.assertEqual(len(set(titles)), 5)
+
     def test_enroll_as_student(self):
         """Тест записи студента на курс"""
         self.client.force_authenticate(user=self.student1)
@@ -135,6 +181,18 @@ class CourseAPITestCase(APITestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_enroll_retry_with_idempotency_key(self):
+        """Тест повтора записи на курс с ключом идемпотентности"""
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:course-enroll", args=[self.course.id])
+
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY="enroll-1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY="enroll-1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+
     def test_material_create_as_owner(self):
         """Тест создания материала владельцем курса"""
         self.client.force_authenticate(user=self.teacher)
@@ -252,6 +310,728 @@ class CourseAPITestCase(APITestCase):
         response = self.client.post(url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_answer_key_grades_without_queries(self):
+        """Тест проверки ответов по закэшированному ключу без запросов"""
+        get_answer_key(self.test.id)
+        user_answers = [
+            {"question": self.question1.id, "answer": self.answer1_correct.id},
+            {"question": self.question2.id, "answer": self.answer2_wrong.id},
+        ]
+        with self.assertNumQueries(0):
+            result = get_answer_key(self.test.id).grade(user_answers)
+        self.assertEqual(result.score, 50)
+        self.assertEqual(result.total_questions, 2)
+
+    def test_answer_key_invalidated_on_answer_change(self):
+        """Тест сброса ключа ответов при изменении правильного ответа"""
+        user_answers = [
+            {"question": self.question2.id, "answer": self.answer2_wrong.id}
+        ]
+        self.assertEqual(
+            get_answer_key(self.test.id).grade(user_answers).correct_answers,
+            0,
+        )
+        self.answer2_wrong.is_correct = True
+        self.answer2_wrong.save()
+        self.assertEqual(
+            get_answer_key(self.test.id).grade(user_answers).correct_answers,
+            1,
+        )
+
+    def test_submit_test_duplicate_questions(self):
+        """Тест повторной отправки с дублирующимися вопросами"""
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:test-submit", args=[self.test.id])
+        data = {
+            "user_answers": [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_wrong.id,
+                },
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                },
+            ]
+        }
+        self.client.post(url, data, format="json")
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["correct_answers"], 1)
+        test_result = TestResult.objects.get(
+            user=self.student1, test=self.test
+        )
+        self.assertEqual(
+            list(
+                test_result.latest_attempt.user_answers.values_list(
+                    "answer", flat=True
+                )
+            ),
+            [self.answer1_correct.id],
+        )
+
+    def test_submit_test_keeps_attempts(self):
+        """Тест сохранения истории попыток и указателя на лучшую"""
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:test-submit", args=[self.test.id])
+        correct = {
+            "user_answers": [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                }
+            ]
+        }
+        self.client.post(url, correct, format="json")
+        self.client.post(url, {"user_answers": []}, format="json")
+
+        test_result = TestResult.objects.get(
+            user=self.student1, test=self.test
+        )
+        self.assertEqual(test_result.attempts_count, 2)
+        self.assertEqual(test_result.score, 0)
+        self.assertEqual(test_result.best_score, 50)
+        self.assertEqual(test_result.best_attempt.score, 50)
+        self.assertEqual(test_result.latest_attempt.score, 0)
+        self.assertEqual(test_result.user_answers.count(), 1)
+
+    def test_submit_retry_with_idempotency_key(self):
+        """Тест повтора отправки теста с ключом идемпотентности"""
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:test-submit", args=[self.test.id])
+        data = {
+            "user_answers": [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                }
+            ]
+        }
+        first = self.client.post(
+            url, data, format="json", HTTP_IDEMPOTENCY_KEY="submit-1"
+        )
+        with self.assertNumQueries(0):
+            second = self.client.post(
+                url, data, format="json", HTTP_IDEMPOTENCY_KEY="submit-1"
+            )
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(
+            TestResult.objects.get(user=self.student1).attempts_count, 1
+        )
+
+        response = self.client.post(
+            url,
+            {"user_answers": []},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="submit-1",
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    def test_submit_test_constant_queries(self):
+        """Тест независимости числа запросов от количества ответов"""
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:test-submit", args=[self.test.id])
+        get_answer_key(self.test.id)
+        one_answer = {
+            "user_answers": [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_wrong.id,
+                }
+            ]
+        }
+        two_answers = {
+            "user_answers": [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_wrong.id,
+                },
+                {
+                    "question": self.question2.id,
+                    "answer": self.answer2_wrong.id,
+                },
+            ]
+        }
+        with CaptureQueriesContext(connection) as first:
+            self.client.post(url, one_answer, format="json")
+        with CaptureQueriesContext(connection) as second:
+            self.client.post(url, two_answers, format="json")
+        self.assertEqual(len(first), len(second))
+
+    def test_submit_test_async(self):
+        """Тест отложенной проверки теста через очередь"""
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:test-submit", args=[self.test.id])
+        data = {
+            "user_answers": [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                },
+            ]
+        }
+        response = self.client.post(
+            url, data, format="json", HTTP_PREFER="respond-async"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        submission_url = reverse(
+            "courses:submission-detail", args=[response.data["submission"]]
+        )
+        self.assertEqual(response["Location"], submission_url)
+        self.assertFalse(TestResult.objects.exists())
+
+        self.assertEqual(grade_pending_submissions(batch_size=10), 1)
+
+        response = self.client.get(submission_url)
+        self.assertEqual(response.data["status"], "done")
+        self.assertEqual(response.data["score"], 50)
+        self.assertEqual(
+            TestResult.objects.get(user=self.student1, test=self.test).score,
+            50,
+        )
+
+    def test_bulk_grade_as_owner(self):
+        """Тест массовой проверки ответов группы владельцем курса"""
+        self.course.students.add(self.student1, self.student2)
+        outsider = User.objects.create_user(
+            email="outsider@example.com", username="outsider", role="student"
+        )
+        self.client.force_authenticate(user=self.teacher)
+        url = reverse("courses:test-bulk-grade", args=[self.test.id])
+        upload = SimpleUploadedFile(
+            "answers.csv",
+            (
+                f"email,{self.question1.id},{self.question2.id}\n"
+                f"{self.student1.email},{self.answer1_correct.id},"
+                f"{self.answer2_correct.id}\n"
+                f"{self.student2.email},{self.answer2_correct.id},\n"
+                f"unknown@example.com,{self.answer1_correct.id},\n"
+                f"{outsider.email},{self.answer1_correct.id},\n"
+                f"{self.admin.email},{self.answer1_correct.id},\n"
+            ).encode(),
+        )
+        response = self.client.post(url, {"file": upload})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["graded"], 2)
+        self.assertEqual(response.data["passed"], 1)
+        self.assertEqual(
+            response.data["unknown_users"],
+            ["unknown@example.com", outsider.email, self.admin.email],
+        )
+        self.assertFalse(
+            TestResult.objects.filter(user__in=[outsider, self.admin])
+        )
+        first = TestResult.objects.get(user=self.student1, test=self.test)
+        second = TestResult.objects.get(user=self.student2, test=self.test)
+        self.assertEqual((first.score, first.is_passed), (100, True))
+        self.assertEqual(first.user_answers.count(), 2)
+        self.assertEqual((second.score, second.is_passed), (0, False))
+        self.assertEqual(second.user_answers.count(), 0)
+
+    def test_grade_cohort_repeated_email(self):
+        """Тест учета последней строки повторяющегося email"""
+        self.course.students.add(self.student1)
+        report = grade_cohort(
+            get_answer_key(self.test.id),
+            [
+                f"email,{self.question1.id},{self.question2.id}",
+                f"{self.student1.email},{self.answer1_correct.id},"
+                f"{self.answer2_correct.id}",
+                f"{self.student1.email},{self.answer1_wrong.id},",
+            ],
+            batch_size=1,
+        )
+        self.assertEqual(
+            (report.students, report.graded, report.passed), (1, 1, 0)
+        )
+        result = TestResult.objects.get(user=self.student1, test=self.test)
+        self.assertEqual((result.score, result.attempts_count), (0, 1))
+        self.assertEqual(result.attempts.count(), 1)
+
+    def test_bulk_grade_as_student(self):
+        """Тест запрета массовой проверки студенту"""
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:test-bulk-grade", args=[self.test.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_regrade_on_answer_key_change(self):
+        """Тест пересчета результатов после исправления ключа ответов"""
+        result = get_answer_key(self.test.id).grade(
+            [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                },
+                {
+                    "question": self.question2.id,
+                    "answer": self.answer2_wrong.id,
+                },
+            ]
+        )
+        save_result(self.student1.id, self.test.id, result)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answer2_wrong.is_correct = True
+            self.answer2_wrong.save()
+
+        test_result = TestResult.objects.get(user=self.student1)
+        self.assertEqual(
+            (test_result.score, test_result.is_passed), (100, True)
+        )
+        self.test.refresh_from_db()
+        self.assertIsNone(self.test.regrade_requested_at)
+
+        with mock.patch(
+            "courses.signals.regrade_test", wraps=regrade_test
+        ) as regrade:
+            with self.captureOnCommitCallbacks(execute=True):
+                for answer in (self.answer1_correct, self.answer2_wrong):
+                    answer.is_correct = not answer.is_correct
+                    answer.save()
+        regrade.assert_called_once_with(self.test.id)
+        test_result.refresh_from_db()
+        self.assertEqual(test_result.score, 0)
+
+        Test.objects.update(regrade_requested_at=None)
+        other_test = Test.objects.create(
+            material=self.material, title="Other Test", passing_score=70
+        )
+        with mock.patch(
+            "courses.signals.regrade_test", wraps=regrade_test
+        ) as regrade:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(ValueError):
+                    with transaction.atomic():
+                        self.answer1_correct.is_correct = True
+                        self.answer1_correct.save()
+                        raise ValueError
+                other_test.passing_score = 50
+                other_test.save()
+        regrade.assert_called_once_with(other_test.id)
+
+    def test_regrade_on_passing_score_change(self):
+        """Тест пересчета статуса прохождения после смены проходного балла"""
+        result = get_answer_key(self.test.id).grade(
+            [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                }
+            ]
+        )
+        save_result(self.student1.id, self.test.id, result)
+        save_result(self.student2.id, self.test.id, result)
+
+        self.test.passing_score = 50
+        self.test.save()
+        self.test.refresh_from_db()
+        self.assertIsNotNone(self.test.regrade_requested_at)
+
+        progress = []
+        updated = regrade_test(
+            self.test.id,
+            chunk_size=1,
+            progress=lambda done, total, rows: progress.append(done),
+        )
+        self.assertEqual(updated, 2)
+        self.assertEqual(len(progress), 2)
+        self.assertTrue(
+            all(TestResult.objects.values_list("is_passed", flat=True))
+        )
+
+    def test_test_result_list_streaming(self):
+        """Тест потоковой выдачи результатов в JSON и NDJSON"""
+        result = get_answer_key(self.test.id).grade(
+            [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                }
+            ]
+        )
+        save_result(self.student1.id, self.test.id, result)
+        save_result(self.student2.id, self.test.id, result)
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:testresult-list")
+
+        with self.settings(STREAM_CHUNK_SIZE=1):
+            response = self.client.get(url, {"stream": "ndjson"})
+            lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [orjson.loads(line) for line in lines]
+        self.assertEqual(
+            {row["user"] for row in rows}, {self.student1.id, self.student2.id}
+        )
+        self.assertEqual(len(rows[0]["user_answers"]), 1)
+
+        with self.settings(STREAM_CHUNK_SIZE=1):
+            response = self.client.get(url, {"stream": "json"})
+            rows = orjson.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(rows), 2)
+
+    def test_course_gradebook(self):
+        """Тест журнала курса в JSON и CSV и его сброса при сдаче"""
+        self.course.students.add(self.student1, self.student2)
+        answer_key = get_answer_key(self.test.id)
+        save_result(
+            self.student1.id,
+            self.test.id,
+            answer_key.grade(
+                [
+                    {
+                        "question": self.question1.id,
+                        "answer": self.answer1_correct.id,
+                    }
+                ]
+            ),
+        )
+        other_test = Test.objects.create(
+            material=self.material, title="Other Test", passing_score=70
+        )
+        url = reverse("courses:course-gradebook", args=[self.course.id])
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(
+            [test["id"] for test in data["tests"]],
+            [self.test.id, other_test.id],
+        )
+        rows = {row["id"]: row["results"] for row in data["students"]}
+        self.assertEqual(rows[self.student1.id][0][:2], [50, False])
+        self.assertEqual(rows[self.student2.id], [None, None])
+
+        save_result(
+            self.student2.id,
+            self.test.id,
+            answer_key.grade(
+                [
+                    {
+                        "question": self.question1.id,
+                        "answer": self.answer1_correct.id,
+                    },
+                    {
+                        "question": self.question2.id,
+                        "answer": self.answer2_correct.id,
+                    },
+                ]
+            ),
+        )
+        with mock.patch(
+            "courses.gradebook.cache.set_many", wraps=cache.set_many
+        ) as set_many:
+            response = self.client.get(url, {"format": "csv"})
+        rebuilt = set_many.call_args.args[0]
+        self.assertEqual(
+            [key.split(":")[2] for key in rebuilt], [str(self.test.id)]
+        )
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        lines = response.content.decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn(",100,True,", lines[2])
+
+        self.client.force_authenticate(user=self.student1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_item_analysis(self):
+        """Тест анализа вопросов теста и его сброса при новой сдаче"""
+        answer_key = get_answer_key(self.test.id)
+        q1, q2 = self.question1, self.question2
+        students = [self.student1, self.student2] + [
+            User.objects.create_user(
+                email=f"student{index}@example.com",
+                username=f"student{index}",
+                role="student",
+            )
+            for index in (3, 4)
+        ]
+        choices = [
+            [(q1, self.answer1_correct), (q2, self.answer2_correct)],
+            [(q1, self.answer1_correct), (q2, self.answer2_wrong)],
+            [(q1, self.answer1_wrong)],
+            [(q1, self.answer1_correct), (q2, self.answer2_correct)],
+        ]
+        for student, answers in zip(students, choices):
+            save_result(
+                student.id,
+                self.test.id,
+                answer_key.grade(
+                    [
+                        {"question": question.id, "answer": answer.id}
+                        for question, answer in answers
+                    ]
+                ),
+            )
+        url = reverse("courses:test-item-analysis", args=[self.test.id])
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], 4)
+        first, second = response.data["questions"]
+        self.assertEqual(first["p_value"], 0.75)
+        self.assertEqual(second["p_value"], 0.5)
+        self.assertEqual(second["omitted"], 0.25)
+        self.assertEqual(
+            {answer["id"]: answer["rate"] for answer in second["answers"]},
+            {self.answer2_correct.id: 0.5, self.answer2_wrong.id: 0.25},
+        )
+        self.assertGreater(first["discrimination"], 0)
+
+        save_result(
+            students[2].id,
+            self.test.id,
+            answer_key.grade(
+                [{"question": q1.id, "answer": self.answer1_correct.id}]
+            ),
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data["questions"][0]["p_value"], 1.0)
+        self.assertIn("too_easy", response.data["questions"][0]["flags"])
+
+        self.client.force_authenticate(user=self.student1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_test_statistics(self):
+        """Тест статистики теста при сдаче, пересдаче и пересчете"""
+        answer_key = get_answer_key(self.test.id)
+        first = [
+            {"question": self.question1.id, "answer": self.answer1_correct.id}
+        ]
+        both = first + [
+            {"question": self.question2.id, "answer": self.answer2_correct.id}
+        ]
+        save_result(self.student1.id, self.test.id, answer_key.grade(first))
+        save_result(self.student2.id, self.test.id, answer_key.grade(both))
+        url = reverse("courses:test-statistics", args=[self.test.id])
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results_count"], 2)
+        self.assertEqual(response.data["pass_rate"], 0.5)
+        self.assertEqual(response.data["mean"], 75)
+        self.assertEqual(response.data["variance"], 625)
+        self.assertEqual(response.data["histogram"][5], 1)
+        self.assertEqual(response.data["histogram"][9], 1)
+
+        save_result(self.student1.id, self.test.id, answer_key.grade(both))
+        response = self.client.get(url)
+        self.assertEqual(response.data["results_count"], 2)
+        self.assertEqual(response.data["attempts_count"], 3)
+        self.assertEqual(response.data["passed_count"], 2)
+        self.assertEqual(response.data["histogram"][5], 0)
+        self.assertEqual(response.data["histogram"][9], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answer2_correct.is_correct = False
+            self.answer2_correct.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["passed_count"], 0)
+        self.assertEqual(response.data["histogram"][5], 2)
+        self.assertEqual(rebuild_statistics([self.test.id]), (1, 0))
+
+        delete_results(TestResult.objects.filter(user=self.student2))
+        response = self.client.get(url)
+        self.assertEqual(response.data["results_count"], 1)
+        self.assertEqual(response.data["attempts_count"], 2)
+        self.assertEqual(rebuild_statistics([self.test.id]), (1, 0))
+
+        self.client.force_authenticate(user=self.student1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_percentile_rank(self):
+        """Тест процентильного ранга в ответе на сдачу и в результате"""
+        answer_key = get_answer_key(self.test.id)
+        first = {
+            "question": self.question1.id,
+            "answer": self.answer1_correct.id,
+        }
+        save_result(self.student2.id, self.test.id, answer_key.grade([]))
+        save_result(self.teacher.id, self.test.id, answer_key.grade([first]))
+        self.client.force_authenticate(user=self.student1)
+        response = self.client.post(
+            reverse("courses:test-submit", args=[self.test.id]),
+            {"user_answers": [first]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # 0, 50, 50: ниже одна оценка, равных две
+        self.assertEqual(response.data["percentile"], 66.7)
+
+        test_result = TestResult.objects.get(user=self.student1)
+        response = self.client.get(
+            reverse("courses:testresult-detail", args=[test_result.id])
+        )
+        self.assertEqual(response.data["percentile"], 66.7)
+
+        save_result(self.student2.id, self.test.id, answer_key.grade([first]))
+        response = self.client.get(
+            reverse("courses:testresult-detail", args=[test_result.id])
+        )
+        self.assertEqual(response.data["percentile"], 50.0)
+
+    def test_leaderboards(self):
+        """Тест лидербордов теста и курса, обновляемых при сдаче"""
+        rebuild_course(self.course.id)
+        self.course.students.add(self.student1, self.student2)
+        answer_key = get_answer_key(self.test.id)
+        first = [
+            {"question": self.question1.id, "answer": self.answer1_correct.id}
+        ]
+        both = first + [
+            {"question": self.question2.id, "answer": self.answer2_correct.id}
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            save_result(
+                self.student1.id, self.test.id, answer_key.grade(first)
+            )
+            save_result(self.student2.id, self.test.id, answer_key.grade(both))
+        test_url = reverse("courses:test-leaderboard", args=[self.test.id])
+        self.client.force_authenticate(user=self.student1)
+        response = self.client.get(test_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["username"], row["score"]) for row in response.data["top"]],
+            [("student2", 100), ("student1", 50)],
+        )
+        self.assertEqual(response.data["me"], {"rank": 2, "score": 50})
+
+        other_test = Test.objects.create(material=self.material, title="T2")
+        other_question = Question.objects.create(test=other_test, text="Q")
+        other_answer = Answer.objects.create(
+            question=other_question, text="A", is_correct=True
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            save_result(
+                self.student1.id,
+                other_test.id,
+                get_answer_key(other_test.id).grade(
+                    [
+                        {
+                            "question": other_question.id,
+                            "answer": other_answer.id,
+                        }
+                    ]
+                ),
+            )
+            save_result(
+                self.student1.id, self.test.id, answer_key.grade(first)
+            )
+        course_url = reverse(
+            "courses:course-leaderboard", args=[self.course.id]
+        )
+        self.client.get(course_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(course_url, {"limit": 1})
+        self.assertEqual(response.data["size"], 2)
+        self.assertEqual(len(response.data["top"]), 1)
+        self.assertEqual(response.data["me"], {"rank": 1, "score": 150})
+
+        expected = self.client.get(course_url).data
+        rebuild_course(self.course.id)
+        self.assertEqual(self.client.get(course_url).data, expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_test.delete()
+        response = self.client.get(course_url)
+        self.assertEqual(response.data["me"], {"rank": 2, "score": 50})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student2.delete()
+        response = self.client.get(course_url)
+        self.assertEqual(response.data["size"], 1)
+        self.assertEqual(response.data["me"], {"rank": 1, "score": 50})
+        self.assertEqual(rebuild_statistics([self.test.id]), (1, 0))
+
+        outsider = User.objects.create_user(
+            email="outsider@example.com", username="outsider", role="student"
+        )
+        self.client.force_authenticate(user=outsider)
+        response = self.client.get(test_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        missing = self.course.id + 100
+        for name in ("courses:course-leaderboard", "courses:test-leaderboard"):
+            response = self.client.get(reverse(name, args=[missing]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_leaderboards_follow_moved_test(self):
+        """Тест пересборки лидербордов курсов при переносе теста и материала"""
+        other_course = Course.objects.create(title="Other", owner=self.teacher)
+        other_material = Material.objects.create(
+            course=other_course, title="Other", order=2
+        )
+        rebuild_course(self.course.id)
+        rebuild_course(other_course.id)
+        result = get_answer_key(self.test.id).grade(
+            [
+                {
+                    "question": self.question1.id,
+                    "answer": self.answer1_correct.id,
+                }
+            ]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            save_result(self.student1.id, self.test.id, result)
+        leaderboards = get_leaderboards()
+        old_board = course_board(self.course.id)
+        new_board = course_board(other_course.id)
+        self.assertEqual(
+            leaderboards.rank(old_board, self.student1.id), (1, 50)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test.material = other_material
+            self.test.save()
+        self.assertIsNone(leaderboards.rank(old_board, self.student1.id))
+        self.assertEqual(
+            leaderboards.rank(new_board, self.student1.id), (1, 50)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_material.course = self.course
+            other_material.save()
+        self.assertEqual(
+            leaderboards.rank(old_board, self.student1.id), (1, 50)
+        )
+        self.assertIsNone(leaderboards.rank(new_board, self.student1.id))
+
+    def test_results_export(self):
+        """Тест потоковой выгрузки результатов в CSV и XLSX"""
+        answer_key = get_answer_key(self.test.id)
+        for student in (self.student1, self.student2):
+            save_result(student.id, self.test.id, answer_key.grade([]))
+        url = reverse("courses:testresult-export")
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(url, {"course": self.course.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("result_id,user_id,email"))
+        self.assertIn("student1@example.com", lines[1])
+        self.assertIn(self.course.title, lines[1])
+
+        response = self.client.get(url, {"date_to": "2000-01-01"})
+        self.assertEqual(len(b"".join(response.streaming_content).split()), 1)
+
+        response = self.client.get(url, {"format": "xlsx"})
+        self.assertIn(".xlsx", response["Content-Disposition"])
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"PK"))
+
+        response = self.client.get(url, {"date_from": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.student1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_course_list_as_anonymous(self):
         """Тест получения списка курсов анонимным пользователем"""
         self.client.logout()
@@ -274,6 +1054,223 @@ class CourseAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], self.course.title)
 
+    def test_course_retrieve_constant_queries(self):
+        """Тест независимости числа запросов от размера курса"""
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:course-detail", args=[self.course.id])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        for order in range(2, 5):
+            Material.objects.create(
+                course=self.course, title=f"Material {order}", order=order
+            )
+        self.course.students.add(self.student1, self.student2)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["materials"]), 4)
+        self.assertEqual(len(small), len(large))
+
+    def test_test_retrieve_constant_queries(self):
+        """Тест загрузки вопросов и ответов теста постоянным числом запросов"""
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:test-detail", args=[self.test.id])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        question = Question.objects.create(test=self.test, text="New", order=3)
+        Answer.objects.create(question=question, text="Yes", is_correct=True)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["questions"]), 3)
+        self.assertEqual(len(small), len(large))
+
+    def test_fragment_cache_invalidates_branch(self):
+        """Тест сброса фрагментов только по ветке измененного ответа"""
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:test-detail", args=[self.test.id])
+        self.client.get(url)
+        other_question = get_version("question", self.question2.id)
+        material = get_version("material", self.material.id)
+
+        self.answer1_wrong.text = "x == 5"
+        self.answer1_wrong.save()
+        response = self.client.get(url)
+        answers = response.data["questions"][0]["answers"]
+        self.assertIn("x == 5", [answer["text"] for answer in answers])
+        self.assertEqual(
+            get_version("question", self.question2.id), other_question
+        )
+        self.assertNotEqual(
+            get_version("material", self.material.id), material
+        )
+
+    def test_course_retrieve_not_modified(self):
+        """Тест ответа 304 на повторный запрос курса с ETag"""
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:course-detail", args=[self.course.id])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Authorization", response["Vary"])
+        self.assertIn("private", response["Cache-Control"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(len(queries), 1)
+
+        self.answer1_wrong.text = "x == 5"
+        self.answer1_wrong.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        self.course.students.add(self.student1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_course_follows_material_move(self):
+        """Тест заполнения course у теста, вопросов и ответов при переносе"""
+        self.assertEqual(self.answer1_correct.course_id, self.course.id)
+        other = Course.objects.create(title="Other", owner=self.teacher)
+        self.material.course = other
+        self.material.order = 2
+        self.material.save()
+        for model in (Test, Question, Answer):
+            self.assertEqual(
+                set(model.objects.values_list("course_id", flat=True)),
+                {other.id},
+            )
+
+        question = Question.objects.create(
+            test=Test.objects.create(material=self.material, title="New"),
+            text="Moved",
+        )
+        Answer.objects.create(question=question, text="Yes")
+        self.test.refresh_from_db()
+        question.test = self.test
+        question.save(update_fields=["test"])
+        self.assertEqual(
+            Answer.objects.get(question=question).course_id, other.id
+        )
+
+    def test_course_access_cached(self):
+        """Тест проверки прав без запросов к БД на прогретом кэше"""
+        self.course.students.add(self.student1)
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:material-detail", args=[self.material.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any("courses_course_students" in q["sql"] for q in queries)
+        )
+
+        self.course.students.remove(self.student1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.course.owner = self.admin
+        self.course.save()
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_course_access_not_cached_stale(self):
+        """Тест: запись на курс во время чтения доступа не кэширует старый"""
+        set_access = cache.set
+
+        def enroll_then_set(*args, **kwargs):
+            self.course.students.add(self.student1)
+            set_access(*args, **kwargs)
+
+        with mock.patch(
+            "courses.access.cache.set", side_effect=enroll_then_set
+        ):
+            access = load_course_access(self.student1.id)
+        self.assertNotIn(self.course.id, access.enrolled)
+        access = load_course_access(self.student1.id)
+        self.assertIn(self.course.id, access.enrolled)
+
+    def test_material_retrieve_not_modified(self):
+        """Тест проверки прав перед ответом 304 на запрос материала"""
+        self.course.students.add(self.student1)
+        self.client.force_authenticate(user=self.student1)
+        url = reverse("courses:material-detail", args=[self.material.id])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.force_authenticate(user=self.student2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_course_retrieve_msgpack(self):
+        """Тест получения и создания курса в формате MessagePack"""
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:course-detail", args=[self.course.id])
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data["title"], self.course.title)
+
+        response = self.client.post(
+            reverse("courses:course-list"),
+            msgpack.packb({"title": "Packed", "description": "Test"}),
+            content_type="application/msgpack",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["title"], "Packed")
+
+    def test_orjson_renderer_types(self):
+        """Тест рендеринга datetime, Decimal и номера телефона"""
+        data = {
+            "at": datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=datetime.UTC),
+            "price": Decimal("9.90"),
+            "phone": PhoneNumber.from_string("+79001234567"),
+        }
+        self.assertEqual(
+            orjson.loads(ORJSONRenderer().render(data)),
+            {
+                "at": "2025-01-02T03:04:05Z",
+                "price": "9.90",
+                "phone": "+79001234567",
+            },
+        )
+
+    def test_course_retrieve_sparse_fields(self):
+        """Тест выборки полей курса через ?fields="""
+        self.course.students.add(self.student1)
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:course-detail", args=[self.course.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "id,title"})
+        self.assertEqual(set(response.data), {"id", "title"})
+        self.assertFalse(
+            any("courses_material" in query["sql"] for query in queries)
+        )
+
+        response = self.client.get(
+            url, {"fields": "title,materials.title", "expand": "owner"}
+        )
+        self.assertEqual(set(response.data), {"title", "materials", "owner"})
+        self.assertEqual(
+            response.data["materials"], [{"title": self.material.title}]
+        )
+
+    def test_course_retrieve_expand(self):
+        """Тест включения вложенных связей курса через ?expand="""
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("courses:course-detail", args=[self.course.id])
+        response = self.client.get(url, {"expand": "materials"})
+        self.assertIn("description", response.data)
+        self.assertNotIn("students", response.data)
+        self.assertNotIn("owner", response.data)
+        self.assertEqual(len(response.data["materials"]), 1)
+
     def test_material_list_as_student(self):
         """Тест получения списка материалов студентом"""
         self.course.students.add(self.student1)
@@ -281,7 +1278,41 @@ class CourseAPITestCase(APITestCase):
         url = reverse("courses:material-list")
         response = self.client.get(url, {"course": self.course.id})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 4)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_material_list_scoped_by_role(self):
+        """Тест ограничения списков курсами пользователя"""
+        other_teacher = User.objects.create_user(
+            email="other@example.com",
+            username="other",
+            password="teacherpass",
+            role="teacher",
+        )
+        other = Course.objects.create(title="Other", owner=other_teacher)
+        Material.objects.create(course=other, title="Other", order=1)
+        url = reverse("courses:material-list")
+
+        expected = {
+            self.admin: 2,
+            self.teacher: 1,
+            other_teacher: 1,
+            self.student1: 0,
+        }
+        for user, count in expected.items():
+            self.client.force_authenticate(user=user)
+            response = self.client.get(url)
+            self.assertEqual(len(response.data["results"]), count, user)
+
+        self.course.students.add(self.student1)
+        self.client.force_authenticate(user=self.student1)
+        response = self.client.get(reverse("courses:answer-list"))
+        self.assertEqual(response.data["results"], [])
+        response = self.client.get(
+            reverse("courses:answer-list"), {"stream": "json"}
+        )
+        self.assertNotIn(b"is_correct", b"".join(response.streaming_content))
+        response = self.client.get(reverse("courses:question-list"))
+        self.assertEqual(response.data["results"], [])
 
     def test_material_retrieve_as_student(self):
         """Тест получения деталей материала студентом"""
@@ -394,6 +1425,41 @@ class QuestionAPITestCase(APITestCase):
             material=self.material, title="Variables Test", passing_score=70
         )
 
+    def test_question_list_pages_with_equal_order(self):
+        """Тест пагинации вопросов с одинаковым порядком"""
+        Question.objects.bulk_create(
+            Question(
+                test=self.test,
+                course=self.course,
+                text=f"Q{number}",
+                order=0,
+            )
+            for number in range(7)
+        )
+        expected = list(
+            Question.objects.order_by("id").values_list("id", flat=True)
+        )
+        self.client.force_authenticate(user=self.teacher)
+
+        ids, url = [], reverse("courses:question-list") + "?page_size=3"
+        while url:
+            response = self.client.get(url)
+            ids += [question["id"] for question in response.data["results"]]
+            previous, url = response.data["previous"], response.data["next"]
+        self.assertEqual(ids, expected)
+
+        ids, url = [], previous
+        while url:
+            response = self.client.get(url)
+            ids = [q["id"] for q in response.data["results"]] + ids
+            url = response.data["previous"]
+        self.assertEqual(ids, expected[:6])
+
+        response = self.client.get(
+            reverse("courses:question-list"), {"cursor": "bad"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_question_create_as_teacher(self):
         """Тест создания вопроса преподавателем"""
         self.client.force_authenticate(user=self.teacher)
@@ -7,6 +7,7 @@ from .views import (
     CourseViewSet,
     MaterialViewSet,
     QuestionViewSet,
+    SubmissionViewSet,
     TestResultViewSet,
     TestViewSet,
 )
@@ -20,6 +21,7 @@ router.register(r"tests", TestViewSet, basename="test")
 router.register(r"questions", QuestionViewSet, basename="question")
 router.register(r"answers", AnswerViewSet, basename="answer")
 router.register(r"test-results", TestResultViewSet, basename="testresult")
+router.register(r"submissions", SubmissionViewSet, basename="submission")
 
 urlpatterns = [
     path("", include(router.urls)),
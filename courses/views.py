@@ -1,18 +1,42 @@
+import io
+
+import orjson
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from loguru import logger
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-
+from rest_framework.settings import api_settings
+
+from config.idempotency import idempotent
+from config.streaming import StreamingListMixin
+
+from .access import CourseScopeMixin, course_exists, test_course_id
+from .analysis import get_item_analysis
+from .cohort import grade_cohort
+from .conditional import ConditionalRetrieveMixin
+from .export import (
+    ResultsCSVRenderer,
+    ResultsXLSXRenderer,
+    export_filters,
+    export_response,
+)
+from .gradebook import GradebookCSVRenderer, get_gradebook
+from .grading import get_answer_key, save_result
+from .leaderboard import board_payload, course_board, test_board
 from .models import (
     Answer,
     Course,
     Material,
     Question,
+    Submission,
     Test,
     TestResult,
-    UserAnswer,
+    TestStatistics,
 )
 from .permissions import (
     CanAccessCourse,
@@ -28,28 +52,58 @@ from .permissions import (
     IsCourseOwner,
     IsTeacher,
 )
+from .prefetch import PrefetchPlanMixin
 from .serializers import (
     AnswerSerializerCreate,
     CourseSerializer,
     MaterialSerializer,
     QuestionSerializer,
+    SubmissionSerializer,
     TestResultSerializer,
     TestSerializer,
+    TestStatisticsSerializer,
 )
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+def _board_id(pk):
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+def _board_limit(request):
+    """Размер лидерборда из ?limit=, не больше LEADERBOARD_MAX_SIZE"""
+    try:
+        limit = int(request.query_params.get("limit", 0))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return settings.LEADERBOARD_SIZE
+    return min(limit, settings.LEADERBOARD_MAX_SIZE)
+
+
+class CourseViewSet(
+    StreamingListMixin,
+    ConditionalRetrieveMixin,
+    PrefetchPlanMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet для управления курсами, включая запись студентов на курсы"""
 
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     lookup_field = "id"
     lookup_url_kwarg = "pk"
+    cursor_ordering = ("-created_at", "-id")
+    etag_namespace = "course"
 
     def get_permissions(self):
         logger.debug(f"Получение прав доступа для действия: {self.action}")
         if self.action in ["list", "retrieve", "enroll"]:
             return [permissions.IsAuthenticated()]
+        elif self.action == "leaderboard":
+            return [permissions.IsAuthenticated(), CanAccessCourse()]
         elif self.action == "create":
             return [permissions.IsAuthenticated(), CanCreateCourse()]
         else:
@@ -57,9 +111,10 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         logger.info(f"Создание курса пользователем: {self.request.user}")
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.pk)
 
     @action(detail=True, methods=["POST"], url_path="enroll")
+    @idempotent
     def enroll(self, request, pk=None):
         course = self.get_object()
         if request.user.role != "student":
@@ -76,7 +131,7 @@ class CourseViewSet(viewsets.ModelViewSet):
                 {"error": "Вы уже зарегистрированы на курс"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        course.students.add(request.user)
+        course.students.add(request.user.pk)
         logger.success(
             f"Пользователь {request.user} успешно записан на курс {course.id}"
         )
@@ -84,8 +139,53 @@ class CourseViewSet(viewsets.ModelViewSet):
             {"status": "запись успешна"}, status=status.HTTP_200_OK
         )
 
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="gradebook",
+        renderer_classes=[
+            *api_settings.DEFAULT_RENDERER_CLASSES,
+            GradebookCSVRenderer,
+        ],
+    )
+    def gradebook(self, request, pk=None):
+        """
+        Журнал курса: студенты x тесты с оценкой, статусом и временем
+        сдачи. CSV - через ?format=csv или Accept: text/csv.
+        """
+        course = self.get_object()
+        logger.info(f"Журнал курса {course.id} для {request.user}")
+        encoded = get_gradebook(course.id)
+        if request.accepted_renderer.format == "json":
+            return HttpResponse(encoded, content_type="application/json")
+        return Response(orjson.loads(encoded))
+
+    @action(detail=True, methods=["get"], url_path="leaderboard")
+    def leaderboard(self, request, pk=None):
+        """
+        Рейтинг студентов курса по сумме лучших оценок за тесты и место
+        текущего пользователя. Наличие курса и права читаются из кэша,
+        рейтинг - из лидерборда, без запросов к БД.
+        """
+        course_id = _board_id(pk)
+        if not course_exists(course_id):
+            raise Http404
+        self.check_object_permissions(request, Course(pk=course_id))
+        return Response(
+            board_payload(
+                course_board(course_id), request.user.pk, _board_limit(request)
+            ),
+            status=status.HTTP_200_OK,
+        )
 
-class MaterialViewSet(viewsets.ModelViewSet):
+
+class MaterialViewSet(
+    StreamingListMixin,
+    ConditionalRetrieveMixin,
+    CourseScopeMixin,
+    PrefetchPlanMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet для управления материалами курсов"""
 
     serializer_class = MaterialSerializer
@@ -93,6 +193,9 @@ class MaterialViewSet(viewsets.ModelViewSet):
     filterset_fields = ["course"]
     lookup_field = "id"
     lookup_url_kwarg = "pk"
+    cursor_ordering = ("order", "id")
+    etag_namespace = "material"
+    etag_select_related = ("course",)
 
     def get_permissions(self):
         logger.debug(
@@ -118,7 +221,13 @@ class MaterialViewSet(viewsets.ModelViewSet):
         serializer.save(course=course)
 
 
-class TestViewSet(viewsets.ModelViewSet):
+class TestViewSet(
+    StreamingListMixin,
+    ConditionalRetrieveMixin,
+    CourseScopeMixin,
+    PrefetchPlanMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet для управления тестами и обработки результатов тестирования"""
 
     serializer_class = TestSerializer
@@ -127,6 +236,8 @@ class TestViewSet(viewsets.ModelViewSet):
     filterset_fields = ["material"]
     lookup_field = "id"
     lookup_url_kwarg = "pk"
+    cursor_ordering = ("id",)
+    etag_namespace = "test"
 
     def get_permissions(self):
         logger.debug(
@@ -134,7 +245,13 @@ class TestViewSet(viewsets.ModelViewSet):
         )
         if self.action == "submit":
             return [permissions.IsAuthenticated(), CanTakeTest()]
-        elif self.action in ["list", "retrieve"]:
+        elif self.action in ["bulk_grade", "item_analysis", "statistics"]:
+            return [
+                permissions.IsAuthenticated(),
+                (IsAdmin | IsTeacher)(),
+                CanManageTest(),
+            ]
+        elif self.action in ["list", "retrieve", "leaderboard"]:
             return [permissions.IsAuthenticated(), CanAccessCourse()]
         elif self.action == "create":
             return [permissions.IsAuthenticated(), CanCreateTest()]
@@ -147,78 +264,156 @@ class TestViewSet(viewsets.ModelViewSet):
         logger.info(f"Создание теста для материала {material.id}")
         serializer.save(material=material)
 
+    @staticmethod
+    def is_async_submit(request):
+        """
+        Отложенная проверка включается настройкой SUBMIT_ASYNC
+        или заголовком Prefer: respond-async
+        """
+        return (
+            settings.SUBMIT_ASYNC
+            or request.headers.get("Prefer") == "respond-async"
+        )
+
     @action(detail=True, methods=["post"], url_path="submit")
+    @idempotent
     def submit(self, request, material_id=None, pk=None):
         logger.debug(f"Отправка теста {pk} пользователем {request.user}")
-        test = get_object_or_404(Test, pk=pk)
+        answer_key = get_answer_key(pk)
+        if answer_key is None:
+            raise Http404
         user_answers = request.data.get("user_answers", [])
 
-        correct_answers = 0
-        total_questions = test.questions.count()
-        valid_answers = []
+        if self.is_async_submit(request):
+            submission = Submission.objects.create(
+                user_id=request.user.pk,
+                test_id=answer_key.test_id,
+                user_answers=user_answers,
+            )
+            logger.info(
+                f"Отправка {submission.id} поставлена в очередь проверки"
+            )
+            return Response(
+                {"submission": submission.id, "status": submission.status},
+                status=status.HTTP_202_ACCEPTED,
+                headers={
+                    "Location": reverse(
+                        "courses:submission-detail", args=[submission.id]
+                    )
+                },
+            )
 
         logger.debug(f"Обработка {len(user_answers)} ответов пользователя")
-        for answer_data in user_answers:
-            question_id = answer_data.get("question")
-            answer_id = answer_data.get("answer")
-
-            try:
-                answer = Answer.objects.get(
-                    pk=answer_id, question_id=question_id, question__test=test
-                )
-                if answer.is_correct:
-                    correct_answers += 1
-                valid_answers.append(answer_data)
-            except Answer.DoesNotExist:
-                logger.warning(
-                    f"Не найден ответ {answer_id} для вопроса {question_id}"
-                )
-                continue
-
-        score = (
-            int((correct_answers / total_questions) * 100)
-            if total_questions > 0
-            else 0
-        )
+        result = answer_key.grade(user_answers)
         logger.info(
-            f"Результат теста: {score}% (правильных:"
-            f" {correct_answers}/{total_questions})"
+            f"Результат теста: {result.score}% (правильных:"
+            f" {result.correct_answers}/{result.total_questions})"
         )
 
-        test_result, created = TestResult.objects.update_or_create(
-            user=request.user,
-            test=test,
-            defaults={
-                "score": score,
-                "is_passed": score >= test.passing_score,
-            },
-        )
+        test_result = save_result(request.user.id, answer_key.test_id, result)
         logger.debug(
-            f"{'Создан' if created else 'Обновлен'} результат теста:"
-            f" {test_result.id}"
+            f"Сохранен результат теста {test_result.id} и"
+            f" {len(result.valid_answers)} ответов пользователя"
         )
 
-        test_result.user_answers.all().delete()
-        for answer_data in valid_answers:
-            UserAnswer.objects.create(
-                test_result=test_result,
-                question_id=answer_data["question"],
-                answer_id=answer_data["answer"],
-            )
-        logger.debug(f"Сохранено {len(valid_answers)} ответов пользователя")
-
+        statistics = TestStatistics.objects.filter(
+            test_id=answer_key.test_id
+        ).first()
         return Response(
             {
-                "score": score,
-                "passed": score >= test.passing_score,
-                "correct_answers": correct_answers,
-                "total_questions": total_questions,
+                "score": result.score,
+                "passed": result.passed,
+                "correct_answers": result.correct_answers,
+                "total_questions": result.total_questions,
+                "percentile": (
+                    statistics.percentile_rank(result.score)
+                    if statistics
+                    else None
+                ),
             },
             status=status.HTTP_201_CREATED,
         )
 
+    @action(detail=True, methods=["post"], url_path="bulk-grade")
+    def bulk_grade(self, request, pk=None):
+        """
+        Массовая проверка ответов группы из CSV файла (поле file):
+        первая строка - email и id вопросов, далее строки студентов
+        """
+        test = self.get_object()
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "Не передан файл с ответами"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        logger.info(
+            f"Массовая проверка теста {test.id} пользователем {request.user}"
+        )
+        try:
+            report = grade_cohort(
+                get_answer_key(test.id),
+                io.TextIOWrapper(upload.file, encoding="utf-8", newline=""),
+            )
+        except (UnicodeDecodeError, ValueError) as error:
+            return Response(
+                {"error": str(error)}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="leaderboard")
+    def leaderboard(self, request, pk=None):
+        """
+        Рейтинг студентов по лучшей оценке за тест и место текущего
+        пользователя. Курс теста и права читаются из кэша, рейтинг -
+        из лидерборда, без запросов к БД.
+        """
+        test_id = _board_id(pk)
+        course_id = test_course_id(test_id)
+        if course_id is None:
+            raise Http404
+        self.check_object_permissions(
+            request, Test(pk=test_id, course_id=course_id)
+        )
+        return Response(
+            board_payload(
+                test_board(test_id), request.user.pk, _board_limit(request)
+            ),
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["get"], url_path="statistics")
+    def statistics(self, request, pk=None):
+        """
+        Статистика текущих результатов теста: число результатов и попыток,
+        доля сдавших, среднее, дисперсия и гистограмма оценок
+        """
+        test = self.get_object()
+        statistics = TestStatistics.objects.filter(
+            test_id=test.id
+        ).first() or TestStatistics(test_id=test.id)
+        return Response(
+            TestStatisticsSerializer(statistics).data,
+            status=status.HTTP_200_OK,
+        )
 
-class QuestionViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=["get"], url_path="item-analysis")
+    def item_analysis(self, request, pk=None):
+        """
+        Анализ вопросов теста: сложность (p_value), различающая
+        способность и доли выбора вариантов ответа
+        """
+        test = self.get_object()
+        logger.info(f"Анализ вопросов теста {test.id} для {request.user}")
+        return Response(get_item_analysis(test.id), status=status.HTTP_200_OK)
+
+
+class QuestionViewSet(
+    StreamingListMixin,
+    CourseScopeMixin,
+    PrefetchPlanMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet для управления вопросами тестов"""
 
     serializer_class = QuestionSerializer
@@ -227,6 +422,8 @@ class QuestionViewSet(viewsets.ModelViewSet):
     filterset_fields = ["test"]
     lookup_field = "id"
     lookup_url_kwarg = "pk"
+    cursor_ordering = ("order", "id")
+    course_scope_students = False
 
     def get_permissions(self):
         logger.debug(
@@ -244,7 +441,12 @@ class QuestionViewSet(viewsets.ModelViewSet):
         serializer.save(test=test)
 
 
-class AnswerViewSet(viewsets.ModelViewSet):
+class AnswerViewSet(
+    StreamingListMixin,
+    CourseScopeMixin,
+    PrefetchPlanMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet для управления вариантами ответов на вопросы"""
 
     serializer_class = AnswerSerializerCreate
@@ -253,6 +455,8 @@ class AnswerViewSet(viewsets.ModelViewSet):
     filterset_fields = ["question"]
     lookup_field = "id"
     lookup_url_kwarg = "pk"
+    cursor_ordering = ("id",)
+    course_scope_students = False
 
     def get_permissions(self):
         logger.debug(
@@ -271,25 +475,83 @@ class AnswerViewSet(viewsets.ModelViewSet):
         serializer.save(question=question)
 
 
-class TestResultViewSet(viewsets.ReadOnlyModelViewSet):
+class TestResultViewSet(
+    StreamingListMixin, PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet
+):
     """ViewSet результатов тестов пользователя"""
 
     serializer_class = TestResultSerializer
-    queryset = TestResult.objects.all()
+    queryset = TestResult.objects.select_related("test__statistics")
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = "id"
     lookup_url_kwarg = "pk"
+    cursor_ordering = ("-completed_at", "-id")
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
 
         if user.role == "student":
-            return self.queryset.filter(user=user)
+            return queryset.filter(user_id=user.pk)
 
-        return self.queryset
+        return queryset
 
     def get_permissions(self):
         logger.debug(
             f"Проверка прав доступа для ответов, действие: {self.action}"
         )
+        if self.action == "export":
+            return [permissions.IsAuthenticated(), (IsAdmin | IsTeacher)()]
         return super().get_permissions()
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        renderer_classes=[
+            ResultsCSVRenderer,
+            ResultsXLSXRenderer,
+            *api_settings.DEFAULT_RENDERER_CLASSES,
+        ],
+    )
+    def export(self, request):
+        """
+        Потоковая выгрузка результатов в CSV (по умолчанию) или XLSX
+        (?format=xlsx) с фильтрами course, test, date_from, date_to.
+        Преподаватель выгружает только результаты своих курсов.
+        """
+        queryset = TestResult.objects.filter(
+            **export_filters(request.query_params)
+        )
+        if request.user.role == "teacher":
+            queryset = queryset.filter(test__course__owner_id=request.user.pk)
+        logger.info(
+            f"Выгрузка результатов в {request.accepted_renderer.format}"
+            f" для {request.user}"
+        )
+        return export_response(queryset, request.accepted_renderer.format)
+
+
+class SubmissionViewSet(
+    StreamingListMixin, PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet
+):
+    """ViewSet статуса отправок, ожидающих проверки"""
+
+    serializer_class = SubmissionSerializer
+    queryset = Submission.objects.all()
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = "id"
+    lookup_url_kwarg = "pk"
+    cursor_ordering = ("-id",)
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = super().get_queryset()
+
+        if user.role == "admin":
+            return queryset
+
+        if user.role == "teacher":
+            return queryset.filter(test__course__owner_id=user.pk)
+
+        return queryset.filter(user_id=user.pk)
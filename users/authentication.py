@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+User = get_user_model()
+
+
+def user_cache_key(user_id):
+    return f"user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """Пользователь из общего кэша, при промахе - из БД"""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, timeout=settings.USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_cached_users(user_ids):
+    """
+    Несколько пользователей из общего кэша одним запросом,
+    промахи загружаются из БД одним запросом.
+    Возвращает {id: пользователь}.
+    """
+    keys = {user_cache_key(user_id): user_id for user_id in user_ids}
+    users = {keys[key]: user for key, user in cache.get_many(keys).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in users]
+    if missing:
+        loaded = {
+            user.pk: user for user in User.objects.filter(pk__in=missing)
+        }
+        cache.set_many(
+            {user_cache_key(pk): user for pk, user in loaded.items()},
+            timeout=settings.USER_CACHE_TIMEOUT,
+        )
+        users.update(loaded)
+    return users
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class ClaimsUser(TokenUser):
+    """
+    Пользователь, собранный из claims access-токена без запроса к БД.
+    Поля модели, которых нет в токене, читаются из полного объекта
+    пользователя через get_cached_user.
+    """
+
+    def __str__(self):
+        return f"{self.username} ({self.role})"
+
+    @cached_property
+    def instance(self):
+        user = get_cached_user(self.pk)
+        if user is None:
+            raise AuthenticationFailed(
+                "Пользователь не найден", code="user_not_found"
+            )
+        return user
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.instance, attr)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без запроса пользователя из БД.
+    Токены с claim role дают ClaimsUser, токены, выданные до появления
+    claims, обрабатываются как в JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if "role" not in validated_token:
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 с числом итераций из настройки PASSWORD_PBKDF2_ITERATIONS.
+    Хеши с другим числом итераций проверяются как обычно и
+    пересчитываются при следующем входе пользователя.
+    """
+
+    @property
+    def iterations(self):
+        return (
+            settings.PASSWORD_PBKDF2_ITERATIONS
+            or PBKDF2PasswordHasher.iterations
+        )
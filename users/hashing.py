@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from loguru import logger
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервер перегружен входами, повторите попытку позже"
+    default_code = "password_hashing_busy"
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="password-hash",
+            )
+            _slots = threading.BoundedSemaphore(
+                settings.PASSWORD_HASH_WORKERS
+                + settings.PASSWORD_HASH_QUEUE_SIZE
+            )
+    return _executor, _slots
+
+
+def run_hashing(func, *args):
+    """
+    Выполняет хеширование в ограниченном пуле потоков.
+    Одновременно считается не больше PASSWORD_HASH_WORKERS хешей, еще
+    PASSWORD_HASH_QUEUE_SIZE ждут в очереди. Если очередь не освободилась
+    за PASSWORD_HASH_QUEUE_TIMEOUT секунд, запрос получает 503.
+    """
+    executor, slots = _pool()
+    if not slots.acquire(timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT):
+        logger.warning("Очередь хеширования паролей переполнена")
+        raise PasswordHashingBusy()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+def check_password(user, raw_password):
+    """
+    Проверяет пароль пользователя в пуле.
+    Если хеш создан другим алгоритмом или с другим числом итераций,
+    пароль пересчитывается текущим хешером и сохраняется.
+    """
+    is_correct, must_update = run_hashing(
+        verify_password, raw_password, user.password
+    )
+    if is_correct and must_update:
+        set_password(user, raw_password)
+        user.save(update_fields=["password"])
+    return is_correct
+
+
+def set_password(user, raw_password):
+    """Аналог user.set_password с хешированием в пуле"""
+    user.password = run_hashing(make_password, raw_password)
+    user._password = raw_password
@@ -0,0 +1,61 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher
+from django.core.management.base import BaseCommand
+
+from users.hashing import run_hashing
+
+
+class Command(BaseCommand):
+    """Замер пропускной способности проверки паролей при входе"""
+
+    help = (
+        "Сравнивает число входов в секунду на ядро: хешер Django по"
+        " умолчанию в потоках запросов и настроенный хешер через пул"
+        " хеширования. Запросы к БД не учитываются, при входе их время"
+        " мало по сравнению с хешированием."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Число одновременных запросов на вход",
+        )
+
+    def handle(self, *args, **options):
+        password = "bench-password"
+        cases = [
+            (
+                "до: PBKDF2 Django в потоках запросов",
+                PBKDF2PasswordHasher(),
+                False,
+            ),
+            (
+                f"после: {settings.PASSWORD_HASHER} через пул"
+                f" ({settings.PASSWORD_HASH_WORKERS} потоков)",
+                get_hasher("default"),
+                True,
+            ),
+        ]
+        cores = min(options["concurrency"], os.cpu_count() or 1)
+        for title, hasher, pooled in cases:
+            encoded = hasher.encode(password, hasher.salt())
+
+            def login(_):
+                if pooled:
+                    return run_hashing(hasher.verify, password, encoded)
+                return hasher.verify(password, encoded)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options["concurrency"]) as requests:
+                list(requests.map(login, range(options["requests"])))
+            rate = options["requests"] / (time.perf_counter() - started)
+            self.stdout.write(
+                f"{title}: {rate:.1f} входов/с, {rate / cores:.1f} на ядро"
+            )
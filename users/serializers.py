@@ -1,6 +1,16 @@
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import get_cached_user
+from .hashing import set_password
+from .tokens import UserRefreshToken, set_user_claims
 
 User = get_user_model()
 
@@ -27,10 +37,10 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         password = validated_data.pop("password")
         user = User(**validated_data)
         user.role = "student"
-        user.set_password(password)
+        set_password(user, password)
         user.save()
 
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
         return {
             "user": {
                 "username": user.username,
@@ -80,3 +90,28 @@ class CustomUserSerializer(serializers.ModelSerializer):
             "id",
             "date_joined",
         ]
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Выдача пары токенов с ролью пользователя в claims"""
+
+    token_class = UserRefreshToken
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление access-токена с актуальными ролью и данными пользователя,
+    чтобы изменения роли применялись не позже истечения access-токена
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"])
+        user = get_cached_user(access[api_settings.USER_ID_CLAIM])
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"],
+                "no_active_account",
+            )
+        data["access"] = str(set_user_claims(access, user))
+        return data
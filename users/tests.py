@@ -1,4 +1,11 @@
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
 from users.models import User
 
@@ -31,3 +38,70 @@ class TestEmailUserManagerAddProf(APITestCase):
         user = User.objects.get(email="email3@emial.ru")
         self.assertEqual(user.email, "email3@emial.ru")
         self.assertEqual(user.role, "student")
+
+
+class StatelessJWTTestCase(APITestCase):
+    """Тесты аутентификации по claims access-токена"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="teacher@example.com",
+            username="teacher",
+            password="teacherpass",
+            role="teacher",
+        )
+
+    def login(self):
+        response = self.client.post(
+            reverse("users:user-login"),
+            {"email": "teacher@example.com", "password": "teacherpass"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_request_without_user_query(self):
+        """Тест проверки роли без запроса пользователя из БД"""
+        tokens = self.login()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("courses:material-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any("users_user" in q["sql"] for q in queries))
+
+        response = self.client.post(
+            reverse("courses:course-list"), {"title": "JWT course"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(reverse("users:user-profile"))
+        self.assertEqual(response.data["email"], "teacher@example.com")
+        self.assertEqual(response.data["country"], None)
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "users.hashers.ConfigurablePBKDF2PasswordHasher",
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+        ],
+        PASSWORD_PBKDF2_ITERATIONS=1000,
+    )
+    def test_login_rehashes_password(self):
+        """Тест пересчета хеша пароля настроенным хешером при входе"""
+        self.user.password = make_password("teacherpass", hasher="md5")
+        self.user.save(update_fields=["password"])
+        self.login()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        self.login()
+
+    def test_refresh_updates_role(self):
+        """Тест обновления роли в токене при обновлении access-токена"""
+        tokens = self.login()
+        self.user.role = "admin"
+        self.user.save()
+        response = self.client.post(
+            reverse("users:user-token_refresh"), {"refresh": tokens["refresh"]}
+        )
+        access = AccessToken(response.data["access"])
+        self.assertEqual(access["role"], "admin")
@@ -0,0 +1,21 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+USER_CLAIMS = ("role", "email", "username", "is_staff", "is_superuser")
+
+
+def set_user_claims(token, user):
+    """Записывает в токен роль и данные пользователя, нужные для прав"""
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh-токен с ролью и данными пользователя в claims.
+    Claims копируются в выданный по нему access-токен.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return set_user_claims(super().for_user(user), user)
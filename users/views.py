@@ -5,6 +5,9 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from config.idempotency import idempotent
+
+from .hashing import set_password
 from .serializers import (
     CustomPasswordChangeSerializer,
     CustomUserSerializer,
@@ -22,6 +25,7 @@ class UserRegisterAPIView(generics.CreateAPIView):
     serializer_class = UserRegisterSerializer
     permission_classes = (AllowAny,)
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         """Метод обработки POST-запроса для регистрации пользователя.
         Метод возвращает информацию о созданном пользователе пропущенную через
@@ -48,10 +52,10 @@ class CustomPasswordChange(APIView):
         )
 
         if serializer.is_valid():
-            user = request.user
+            user = User.objects.get(pk=request.user.pk)
 
             new_password = serializer.data["new_password"]
-            user.set_password(new_password)
+            set_password(user, new_password)
             user.save()
 
             content = {"success": _("Пароль успешно изменен.")}